@@ -0,0 +1,54 @@
+"""Import time benchmark of jupyter_rtc.
+
+Each import runs in a fresh interpreter with `-X importtime`, and the
+cumulative time of the module is reported along with whether the native
+automerge module was loaded.
+
+    python benchmarks/import_time.py [--repeat 10] [module ...]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+
+NATIVE = 'jupyter_rtc_automerge.jupyter_rtc_automerge'
+
+SCRIPT = f"""
+import sys
+import {{module}}
+print({NATIVE!r} in sys.modules)
+"""
+
+
+def import_time(module):
+    """Return the cumulative import time of `module` in microseconds, and
+    whether importing it loaded the native module."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', SCRIPT.format(module=module)],
+        capture_output=True, text=True, check=True,
+    )
+    cumulative = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = [field.strip() for field in line[len('import time:'):].split('|')]
+        if fields[2] == module:
+            cumulative = int(fields[1])
+    return cumulative, result.stdout.strip() == 'True'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('modules', nargs='*', default=['jupyter_rtc', 'jupyter_rtc.app'])
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+    for module in args.modules:
+        runs = [import_time(module) for _ in range(args.repeat)]
+        times = [time for time, _ in runs]
+        print(f'{module}: median {statistics.median(times) / 1000:.1f} ms, '
+              f'min {min(times) / 1000:.1f} ms over {args.repeat} runs, '
+              f'native module loaded: {runs[0][1]}')
+
+
+if __name__ == '__main__':
+    main()
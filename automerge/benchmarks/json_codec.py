@@ -0,0 +1,56 @@
+"""JSON codec benchmark of the collaboration messages.
+
+An `all_changes` message is built with changes of random bytes, for growing
+total sizes, and encoded then decoded with each installed backend. The
+median time is reported along with the encoded size.
+
+    python benchmarks/json_codec.py [--repeat 5] [--change-bytes 200] [size ...]
+"""
+import argparse
+import random
+import statistics
+import time
+
+from jupyter_rtc.codec import available_backends, get_backend
+
+
+def all_changes_message(total_bytes, change_bytes, seed=0):
+    rng = random.Random(seed)
+    changes = [
+        [rng.randrange(256) for _ in range(change_bytes)]
+        for _ in range(max(1, total_bytes // change_bytes))
+    ]
+    return {'action': 'all_changes', 'changes': changes, 'baseline': 0}
+
+
+def median_time(function, argument, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(argument)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int,
+                        default=[1024, 16 * 1024, 256 * 1024, 1024 * 1024, 8 * 1024 * 1024],
+                        help='Bytes of changes carried by the message.')
+    parser.add_argument('--change-bytes', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    backends = [get_backend(name) for name in available_backends()]
+    for size in args.sizes:
+        message = all_changes_message(size, args.change_bytes)
+        for backend in backends:
+            encoded = backend.dumps(message)
+            dumps = median_time(backend.dumps, message, args.repeat)
+            loads = median_time(backend.loads, encoded, args.repeat)
+            print(f'{size:>10} bytes of changes, {backend.name:>6}: '
+                  f'dumps {dumps * 1000:8.2f} ms, loads {loads * 1000:8.2f} ms, '
+                  f'{len(encoded)} bytes encoded')
+
+
+if __name__ == '__main__':
+    main()
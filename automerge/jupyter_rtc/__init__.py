@@ -2,23 +2,34 @@
 import json
 import os.path as osp
 
-from ._version import __version__
-
 HERE = osp.abspath(osp.dirname(__file__))
 
-with open(osp.join(HERE, 'labextension', 'package.json')) as fid:
-    data = json.load(fid)
 
 def _jupyter_labextension_paths():
+    # Read lazily so importing the package does not touch the disk.
+    with open(osp.join(HERE, 'labextension', 'package.json')) as fid:
+        data = json.load(fid)
     return [{
         'src': 'labextension',
         'dest': data['name']
     }]
 
-from .app import JupyterRTCApp
+
+def __getattr__(name):
+    # The version comes from the labextension metadata, and the server
+    # extension pulls in the native automerge module: both are only loaded
+    # once asked for.
+    if name == '__version__':
+        from ._version import __version__
+        return __version__
+    if name == 'JupyterRTCApp':
+        from .app import JupyterRTCApp
+        return JupyterRTCApp
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def _jupyter_server_extension_paths():
+    from .app import JupyterRTCApp
     return [{
         "module": "jupyter_rtc.app",
         "app": JupyterRTCApp
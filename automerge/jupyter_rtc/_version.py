@@ -17,4 +17,10 @@ def _fetchVersion():
     raise FileNotFoundError('Could not find package.json under dir {}'.format(HERE))
 
 
-__version__ = _fetchVersion()
+def __getattr__(name):
+    # The version is read from the labextension metadata on first access only.
+    global __version__
+    if name == '__version__':
+        __version__ = _fetchVersion()
+        return __version__
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,10 +1,18 @@
 import os
 import jinja2
 
+from traitlets import Bool, Float, Integer, Unicode
+
 from jupyter_server.extension.application import ExtensionApp, ExtensionAppJinjaMixin
 from jupyter_server.utils import url_path_join
 
-from .handlers import DefaultHandler, ExampleHandler, WsRTCManager
+from .codec import MessageCodec
+from .compression import SnapshotCompressor, load_dictionary
+from .handlers import (
+    DefaultHandler, ExampleHandler, HistoryHandler, RoomsHandler, SnapshotDictionaryHandler,
+    WsRTCManager, rooms
+)
+from .watcher import FileWatcher
 
 
 class JupyterRTCApp(ExtensionApp):
@@ -17,8 +25,151 @@ class JupyterRTCApp(ExtensionApp):
     # Should your extension expose other server extensions when launched directly?
     load_other_extensions = True
 
+    history_max_changes = Integer(0, config=True,
+        help="""Number of changes a room keeps before its history is compacted
+        into a fresh baseline document. 0 keeps the full history forever.""")
+
+    history_window = Float(3600, config=True,
+        help="""Minimum age, in seconds, of a room baseline before it can be
+        compacted, so recent history is always kept in full.""")
+
+    history_dir = Unicode('', config=True,
+        help="""Directory where the change log and checkpoints of each room are
+        stored to rebuild past states of its document. It is kept across
+        restarts. Empty disables it.""")
+
+    checkpoint_interval = Integer(100, config=True,
+        help="""Number of changes between two checkpoints, i.e. the most changes
+        replayed to rebuild a past state.""")
+
+    checkpoint_byte_budget = Integer(0, config=True,
+        help="""Bytes of changes after which a checkpoint is taken even if
+        checkpoint_interval is not reached. 0 disables it.""")
+
+    checkpoint_cache_size = Integer(8, config=True,
+        help="Number of checkpoints of each room kept in memory.")
+
+    websocket_compression_level = Integer(6, config=True,
+        help="""zlib level of the permessage-deflate compression negotiated on
+        the collaboration websocket. 0 disables websocket compression.""")
+
+    websocket_compression_mem_level = Integer(5, config=True,
+        help="""zlib mem_level (1-9) of the websocket compression, trading
+        memory per connection for compression ratio.""")
+
+    snapshot_min_bytes = Integer(64 * 1024, config=True,
+        help="""Document size above which clients that negotiated a snapshot
+        codec receive a compressed binary snapshot when joining a room.""")
+
+    snapshot_compression_level = Integer(6, config=True,
+        help="Compression level of the binary room snapshots.")
+
+    snapshot_dictionary = Unicode('', config=True,
+        help="""Path of a pre-trained dictionary used to compress room snapshots.
+        Defaults to a small built-in dictionary.""")
+
+    messages_per_second = Float(100, config=True,
+        help="""Messages per second a single collaboration connection may send.
+        0 disables the limit.""")
+
+    bytes_per_second = Integer(4 * 1024 * 1024, config=True,
+        help="""Bytes per second a single collaboration connection may send. A
+        message larger than this is rejected. 0 disables the limit.""")
+
+    room_messages_per_second = Float(1000, config=True,
+        help="Messages per second accepted by a room from all its connections.")
+
+    room_bytes_per_second = Integer(16 * 1024 * 1024, config=True,
+        help="Bytes per second accepted by a room from all its connections.")
+
+    max_change_bytes = Integer(1024 * 1024, config=True,
+        help="""Largest change, in bytes, applied to a room. Larger changes are
+        rejected before reaching automerge. 0 disables the check.""")
+
+    rate_limit_max_delay = Float(2, config=True,
+        help="""Longest delay, in seconds, a message over the rate limits is
+        queued for. Longer delays reject the queue and resync the client.""")
+
+    rate_limit_max_pending = Integer(100, config=True,
+        help="""Number of messages a connection may have queued by the rate
+        limits before its queue is rejected and the client resynced.""")
+
+    viewer_max_pending = Integer(16, config=True,
+        help="""Number of unflushed messages a viewer may have before it is
+        skipped by the broadcast, and resynced once it caught up.""")
+
+    watch_files = Bool(True, config=True,
+        help="Update rooms when their file is changed outside of the collaboration.")
+
+    watch_use_inotify = Bool(True, config=True,
+        help="""Watch files with inotify when watchdog is installed. Otherwise,
+        or when False, the files of the open rooms are polled.""")
+
+    watch_poll_interval = Float(2, config=True,
+        help="Seconds between two polls of the files of the open rooms.")
+
+    watch_debounce = Float(0.2, config=True,
+        help="Seconds a file must stay unchanged before a burst of changes is applied.")
+
+    json_backend = Unicode('auto', config=True,
+        help="""JSON library of the collaboration messages: 'orjson', 'json', or
+        'auto' for orjson when it is installed.""")
+
+    json_offload_bytes = Integer(1024 * 1024, config=True,
+        help="""Estimated size above which the changes sent to joining clients
+        are encoded in a thread pool, off the IOLoop. 0 disables it.""")
+
+    json_offload_workers = Integer(2, config=True,
+        help="Number of threads encoding the large collaboration messages.")
+
     def initialize_settings(self):
         self.log.info(f'{self.name} is enabled.')
+        self.message_codec = MessageCodec(
+            self.json_backend,
+            offload_bytes=self.json_offload_bytes,
+            max_workers=self.json_offload_workers,
+        )
+        self.snapshot_compressor = SnapshotCompressor(
+            load_dictionary(self.snapshot_dictionary),
+            level=self.snapshot_compression_level,
+        )
+        self.file_watcher = FileWatcher(
+            self.serverapp.root_dir,
+            self.on_file_changed,
+            debounce=self.watch_debounce,
+            poll_interval=self.watch_poll_interval,
+            use_inotify=self.watch_use_inotify,
+        )
+        if self.watch_files:
+            self.file_watcher.start()
+        self.hook_saves()
+
+    def hook_saves(self):
+        """Record the content saved to the file of a room, so the watcher
+        does not take a save of this server for an external edit."""
+        contents_manager = self.serverapp.contents_manager
+        previous_hook = contents_manager.pre_save_hook
+
+        def pre_save_hook(model, path, contents_manager, **kwargs):
+            if previous_hook is not None:
+                previous_hook(model=model, path=path, contents_manager=contents_manager, **kwargs)
+            room = rooms.get(path) or rooms.get('/' + path)
+            # Chunked uploads of a large file only carry a part of its content.
+            if (room is not None and model.get('type') == 'file'
+                    and model.get('format') == 'text' and 'chunk' not in model):
+                room.saved(model['content'])
+
+        contents_manager.pre_save_hook = pre_save_hook
+
+    def on_file_changed(self, path):
+        room = rooms.get(path)
+        if room is None:
+            self.file_watcher.unwatch(path)
+            return
+        model = self.serverapp.contents_manager.get(
+            path=path, type='file', format='text', content=True,
+        )
+        room.reconcile(model['content'])
 
     def initialize_handlers(self):
         host_pattern = ".*$"
@@ -27,6 +178,9 @@ class JupyterRTCApp(ExtensionApp):
         self.handlers.extend([
             (r'/{}/default'.format(self.name), DefaultHandler),
             (r'/{}/example'.format(self.name), ExampleHandler),
+            (r'/{}/rooms'.format(self.name), RoomsHandler),
+            (r'/{}/history'.format(self.name), HistoryHandler),
+            (r'/{}/snapshot_dictionary'.format(self.name), SnapshotDictionaryHandler),
             (r'/{}/collaboration'.format(self.name), WsRTCManager),
         ])
 
@@ -0,0 +1,87 @@
+"""JSON codec of the messages exchanged on the collaboration websocket.
+
+orjson is used when it is installed, the standard library otherwise. Both
+backends encode to text, as the messages are sent in text frames. The
+`init` and `all_changes` payloads carry every change of a room as lists of
+ints; once their estimated size reaches `offload_bytes` they are encoded in
+a thread pool instead of blocking the IOLoop.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from tornado.ioloop import IOLoop
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def available_backends():
+    if orjson is None:
+        return ['json']
+    return ['orjson', 'json']
+
+
+class JSONBackend:
+    name = 'json'
+
+    def dumps(self, obj):
+        return json.dumps(obj, separators=(',', ':'))
+
+    def loads(self, message):
+        return json.loads(message)
+
+
+class OrjsonBackend:
+    name = 'orjson'
+
+    def dumps(self, obj):
+        return orjson.dumps(obj).decode()
+
+    def loads(self, message):
+        return orjson.loads(message)
+
+
+BACKENDS = {'json': JSONBackend, 'orjson': OrjsonBackend}
+
+
+def get_backend(name='auto'):
+    """Return the backend called `name`, or the fastest one installed for 'auto'."""
+    if name == 'auto':
+        name = available_backends()[0]
+    if name not in available_backends():
+        raise ValueError(f'JSON backend {name!r} is not available, use one of {available_backends()}')
+    return BACKENDS[name]()
+
+
+def estimate_changes_bytes(changes):
+    # A change byte is encoded as up to 3 digits and a comma.
+    return 4 * sum(len(change) for change in changes)
+
+
+class MessageCodec:
+
+    def __init__(self, backend='auto', offload_bytes=1024 * 1024, max_workers=2):
+        self.backend = get_backend(backend)
+        self.offload_bytes = offload_bytes
+        self.max_workers = max_workers
+        self.executor = None
+
+
+    def dumps(self, obj):
+        return self.backend.dumps(obj)
+
+
+    def loads(self, message):
+        return self.backend.loads(message)
+
+
+    async def dumps_async(self, obj, size):
+        """Encode `obj`, in the thread pool if its estimated `size` in bytes
+        reaches `offload_bytes`. 0 disables the offloading."""
+        if not self.offload_bytes or size < self.offload_bytes:
+            return self.dumps(obj)
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix='jupyter_rtc_codec')
+        return await IOLoop.current().run_in_executor(self.executor, self.dumps, obj)
@@ -0,0 +1,145 @@
+"""Compressed binary snapshots of the changes of a room.
+
+A snapshot is sent instead of the json `init` payload to clients that
+negotiated it with the `snapshot` query argument. Its layout is:
+
+    header: magic, codec id, dictionary id, baseline
+    body:   compressed sequence of (length, change bytes)
+"""
+import hashlib
+import struct
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Byte sequences carried by every textarea change: the automerge chunk
+# magic, the root keys of the document and the default change messages.
+# It only helps the first changes of a snapshot; a dictionary trained on
+# real room histories with scripts/train_snapshot_dictionary.py does better.
+DEFAULT_DICTIONARY = b''.join([
+    b'\x85\x6f\x4a\x83\x01',
+    b'set root object',
+    b'docId',
+    b'textArea',
+    b'\x85\x6f\x4a\x83\x01',
+    b'\x00\x01\x00\x00\x00\x00\x00\x00',
+])
+
+SNAPSHOT_MAGIC = b'RTCS'
+
+CODECS = {'zlib': 1, 'zstd': 2}
+
+_HEADER = struct.Struct('>4sB8sI')
+_LENGTH = struct.Struct('>I')
+
+
+def available_codecs():
+    if zstandard is None:
+        return ['zlib']
+    return ['zstd', 'zlib']
+
+
+def negotiate_codec(requested):
+    """Return the first codec of the comma separated `requested` list supported here."""
+    if not requested:
+        return None
+    available = available_codecs()
+    for codec in requested.split(','):
+        codec = codec.strip()
+        if codec in available:
+            return codec
+    return None
+
+
+def load_dictionary(path):
+    if not path:
+        return DEFAULT_DICTIONARY
+    with open(path, 'rb') as fid:
+        return fid.read()
+
+
+def train_dictionary(snapshots, size=16 * 1024, sample_bytes=4096):
+    """Train a zstd dictionary from a list of change lists, e.g. real room histories.
+
+    Each snapshot is cut in samples of `sample_bytes`, so long histories
+    give many samples instead of one. See scripts/train_snapshot_dictionary.py.
+    """
+    if zstandard is None:
+        raise RuntimeError('Training a snapshot dictionary requires zstandard')
+    samples = []
+    for changes in snapshots:
+        data = _frame(changes)
+        samples.extend(data[i:i + sample_bytes] for i in range(0, len(data), sample_bytes))
+    return zstandard.train_dictionary(size, samples).as_bytes()
+
+
+def _frame(changes):
+    chunks = []
+    for change in changes:
+        change = bytes(change)
+        chunks.append(_LENGTH.pack(len(change)))
+        chunks.append(change)
+    return b''.join(chunks)
+
+
+def _unframe(data):
+    changes = []
+    offset = 0
+    while offset < len(data):
+        (length,) = _LENGTH.unpack_from(data, offset)
+        offset += _LENGTH.size
+        changes.append(data[offset:offset + length])
+        offset += length
+    return changes
+
+
+class SnapshotCompressor:
+
+    def __init__(self, dictionary=DEFAULT_DICTIONARY, level=6):
+        self.dictionary = dictionary
+        self.dictionary_id = hashlib.sha1(dictionary).digest()[:8]
+        self.level = level
+        self._zstd_dictionary = None
+        if zstandard is not None:
+            # A trained dictionary carries its entropy tables, the built-in
+            # one is raw content.
+            self._zstd_dictionary = zstandard.ZstdCompressionDict(
+                dictionary, dict_type=zstandard.DICT_TYPE_AUTO)
+
+
+    def compress(self, changes, baseline=0, codec='zlib'):
+        data = _frame(changes)
+        if codec == 'zstd':
+            compressor = zstandard.ZstdCompressor(
+                level=self.level, dict_data=self._zstd_dictionary)
+            body = compressor.compress(data)
+        elif codec == 'zlib':
+            compressor = zlib.compressobj(self.level, zdict=self.dictionary)
+            body = compressor.compress(data) + compressor.flush()
+        else:
+            raise ValueError(f'Unknown snapshot codec {codec}')
+        header = _HEADER.pack(SNAPSHOT_MAGIC, CODECS[codec], self.dictionary_id, baseline)
+        return header + body
+
+
+    def decompress(self, blob):
+        """Return the `(changes, baseline)` held by a snapshot."""
+        magic, codec_id, dictionary_id, baseline = _HEADER.unpack_from(blob)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError('Not a snapshot')
+        if dictionary_id != self.dictionary_id:
+            raise ValueError('Snapshot was compressed with another dictionary')
+        body = blob[_HEADER.size:]
+        if codec_id == CODECS['zstd']:
+            decompressor = zstandard.ZstdDecompressor(dict_data=self._zstd_dictionary)
+            data = decompressor.decompress(body)
+        elif codec_id == CODECS['zlib']:
+            decompressor = zlib.decompressobj(zdict=self.dictionary)
+            data = decompressor.decompress(body) + decompressor.flush()
+        else:
+            raise ValueError(f'Unknown snapshot codec id {codec_id}')
+        return _unframe(data), baseline
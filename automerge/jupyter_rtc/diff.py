@@ -0,0 +1,109 @@
+"""Minimal text diffs and merges, used to reconcile a room with a new content of its file."""
+from difflib import SequenceMatcher
+
+
+def simple_diff(a, b):
+    """Return the single `(index, remove, insert)` edit turning `a` into `b`,
+    after trimming their common prefix and suffix."""
+    left = 0
+    while left < len(a) and left < len(b) and a[left] == b[left]:
+        left += 1
+    right = 0
+    while (right + left < len(a) and right + left < len(b)
+           and a[len(a) - right - 1] == b[len(b) - right - 1]):
+        right += 1
+    return (left, len(a) - left - right, b[left:len(b) - right])
+
+
+def text_diff(a, b):
+    """Return the `(index, remove, insert)` edits turning `a` into `b`.
+
+    Indices are positions in `a`, edits are in increasing order and do not
+    overlap. The lines are diffed first, then each changed block of lines
+    is narrowed down to the characters that changed.
+    """
+    if a == b:
+        return []
+    prefix, _, _ = simple_diff(a, b)
+    a_lines = a[prefix:].splitlines(keepends=True)
+    b_lines = b[prefix:].splitlines(keepends=True)
+    offsets = [prefix]
+    for line in a_lines:
+        offsets.append(offsets[-1] + len(line))
+    edits = []
+    matcher = SequenceMatcher(None, a_lines, b_lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        index, remove, insert = simple_diff(''.join(a_lines[i1:i2]), ''.join(b_lines[j1:j2]))
+        if remove or insert:
+            edits.append((offsets[i1] + index, remove, insert))
+    return edits
+
+
+def apply_diff(a, edits):
+    """Apply the edits returned by `text_diff` to `a`."""
+    for index, remove, insert in reversed(edits):
+        a = a[:index] + insert + a[index + remove:]
+    return a
+
+
+def changed_lines(base_lines, lines, context=3):
+    """Return the `(i1, i2, j1, j2)` hunks of `base_lines` replaced by `lines[j1:j2]`.
+
+    The common leading and trailing lines are trimmed before diffing, and
+    changes separated by less than `context` equal lines are one hunk, as
+    the alignment of repeated lines can split a single edit in pieces.
+    """
+    start = 0
+    while start < min(len(base_lines), len(lines)) and base_lines[start] == lines[start]:
+        start += 1
+    end = 0
+    while (end < min(len(base_lines), len(lines)) - start
+           and base_lines[-end - 1] == lines[-end - 1]):
+        end += 1
+    matcher = SequenceMatcher(
+        None, base_lines[start:len(base_lines) - end], lines[start:len(lines) - end], autojunk=False)
+    hunks = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        i1, i2, j1, j2 = i1 + start, i2 + start, j1 + start, j2 + start
+        if hunks and i1 - hunks[-1][1] < context:
+            previous_i1, _, previous_j1, _ = hunks.pop()
+            i1, j1 = previous_i1, previous_j1
+        hunks.append((i1, i2, j1, j2))
+    return hunks
+
+
+def merge_diff(base, ours, theirs):
+    """Return the edits of `base` -> `theirs` rebased onto `ours`, as edits of `ours`.
+
+    `ours` and `theirs` were both derived from `base`. As in a three-way
+    merge, the hunks of lines changed by `theirs` are applied whole, or
+    dropped whole when they overlap or touch a hunk that `ours` changed
+    too: `ours` wins the conflicts, and identical edits are only applied
+    once. A hunk is never applied in part, as that could leave a text
+    neither side wrote.
+    """
+    base_lines = base.splitlines(keepends=True)
+    our_lines = ours.splitlines(keepends=True)
+    their_lines = theirs.splitlines(keepends=True)
+    offsets = [0]
+    for line in base_lines:
+        offsets.append(offsets[-1] + len(line))
+    our_hunks = changed_lines(base_lines, our_lines)
+    edits = []
+    shift = 0
+    position = 0
+    for i1, i2, j1, j2 in changed_lines(base_lines, their_lines):
+        # Our hunks ending before this one shift it in `ours`.
+        while position < len(our_hunks) and our_hunks[position][1] < i1:
+            o1, o2, k1, k2 = our_hunks[position]
+            shift += sum(map(len, our_lines[k1:k2])) - (offsets[o2] - offsets[o1])
+            position += 1
+        if position < len(our_hunks) and our_hunks[position][0] <= i2:
+            continue
+        index, remove, insert = simple_diff(base[offsets[i1]:offsets[i2]], ''.join(their_lines[j1:j2]))
+        edits.append((offsets[i1] + shift + index, remove, insert))
+    return edits
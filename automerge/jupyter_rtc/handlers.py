@@ -1,4 +1,10 @@
+import hashlib
 import json
+import logging
+import math
+import os
+import time
+from collections import Counter, deque
 
 import tornado
 from tornado.websocket import WebSocketHandler, websocket_connect
@@ -10,16 +16,59 @@ from jupyter_server.base.zmqhandlers import WebSocketMixin
 
 from jupyter_rtc_automerge import textarea
 
+from .codec import MessageCodec, estimate_changes_bytes
+from .compression import negotiate_codec
+from .diff import merge_diff
+from .history import CheckpointIndex
+from .observers import Observers
+from .ratelimit import RateLimiter
+from .viewers import ViewerGroup
+
+
+log = logging.getLogger(__name__)
 
 rooms = {}
 
 
+def change_hash(change):
+    return hashlib.sha256(bytes(change)).digest()
+
+
 class Room:
 
-    def __init__(self, room, text):
+    def __init__(self, room, text, history_max_changes=0, history_window=0,
+                 messages_per_second=0, bytes_per_second=0, max_change_bytes=0,
+                 viewer_max_pending=16, history_dir='', checkpoint_interval=100,
+                 checkpoint_byte_budget=0, checkpoint_cache_size=8, codec=None):
         self.room = room
+        self.codec = codec or MessageCodec()
         self.websockets = []
+        self.viewers = ViewerGroup(viewer_max_pending)
+        self.limiter = RateLimiter(messages_per_second, bytes_per_second)
+        self.max_change_bytes = max_change_bytes
+        self.metrics = Counter()
+        self.observers = Observers()
+        # History retention: once the document carries more than
+        # `history_max_changes` changes and its baseline is older than
+        # `history_window` seconds, the history is folded into a new baseline.
+        self.history_max_changes = history_max_changes
+        self.history_window = history_window
         self.document = textarea.new_document(room, text)
+        # Last content of the file on disk, read or saved by this server.
+        self.disk_text = text
+        self.changes_count = len(self.get_all_changes())
+        self.index_change_hashes()
+        self.baseline = 0
+        self.baseline_time = time.monotonic()
+        self.snapshots = {}
+        self.all_changes_message = (None, None)
+        self.history = None
+        if history_dir:
+            directory = os.path.join(history_dir, hashlib.sha1(room.encode()).hexdigest())
+            self.history = CheckpointIndex(
+                directory, self.document, self.changes_count, checkpoint_interval,
+                checkpoint_byte_budget, checkpoint_cache_size,
+            )
         print("Room initialized with text:", text)
         print("Room initialized with document:", self.document)
 
@@ -28,32 +77,262 @@ class Room:
         return textarea.get_all_changes(self.document)
 
 
+    def index_change_hashes(self):
+        # Hashes of the applied changes, to drop the ones clients send again.
+        self.change_hashes = {change_hash(c) for c in self.get_all_changes()}
+
+
+    def change_applied(self, change, patch=None):
+        self.changes_count += 1
+        self.change_hashes.add(change_hash(change))
+        if self.history is not None:
+            self.history.record(change, self.document)
+        if patch is not None and self.observers:
+            self.observers.notify(self, self.codec.loads(patch))
+
+
+    def observe(self, path, callback):
+        """Call `callback(room, patches)` with the patches of each change touching `path`,
+        e.g. `textArea`. Returns a handle for `unobserve`."""
+        return self.observers.add(path, callback)
+
+
+    def unobserve(self, observer):
+        self.observers.remove(observer)
+
+
+    def get_document_at(self, change_index=None, timestamp=None):
+        """Return the document after `change_index` changes since the room
+        was created, each new baseline counting as one, or as it was at
+        `timestamp`."""
+        if self.history is None:
+            raise ValueError('History checkpoints are disabled')
+        return self.history.get_document_at(change_index, timestamp)
+
+
+    @property
+    def version(self):
+        return (self.baseline, self.changes_count)
+
+
+    def get_snapshot(self, compressor, codec):
+        """Return the compressed snapshot of the room, compressed once per room version."""
+        cached = self.snapshots.get(codec)
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+        blob = compressor.compress(self.get_all_changes(), self.baseline, codec)
+        self.snapshots[codec] = (self.version, blob)
+        return blob
+
+
+    def memory_usage(self):
+        return {
+            'room': self.room,
+            'document_bytes': len(self.document),
+            'changes': self.changes_count,
+            'baseline': self.baseline,
+            'websockets': len(self.websockets),
+            'viewers': len(self.viewers),
+        }
+
+
+    def should_compact_history(self):
+        if self.history_max_changes <= 0:
+            return False
+        if self.changes_count <= self.history_max_changes:
+            return False
+        return time.monotonic() - self.baseline_time >= self.history_window
+
+
+    def compact_history(self):
+        """Replace the document with a baseline holding the current text and a fresh history.
+
+        Automerge changes are hash-chained to their ancestors, so the whole
+        history is folded at once. Every connected client is sent the new
+        baseline as a full reload; changes still tagged with an older
+        baseline are answered with the same reload instead of being applied.
+        """
+        before = self.memory_usage()
+        self.reset(textarea.get_text(self.document))
+        after = self.memory_usage()
+        log.info(f'Compacted history of room {self.room}: {before} -> {after}')
+
+
+    def reset(self, text):
+        """Start a new baseline document holding `text` and reload every client."""
+        self.document = textarea.new_document(self.room, text)
+        self.changes_count = len(self.get_all_changes())
+        self.index_change_hashes()
+        self.baseline += 1
+        self.baseline_time = time.monotonic()
+        if self.history is not None:
+            self.history.rebaseline(self.document)
+        for ws in self.websockets:
+            self.send_all_changes(ws)
+        self.viewers.broadcast(self.room, self.get_all_changes_message(), self.send_all_changes)
+
+
+    def saved(self, text):
+        """Record that `text` was saved to the file of the room by this server."""
+        self.disk_text = text
+
+
+    def reconcile(self, text):
+        """Merge `text`, a new content of the file on disk, into the room.
+
+        Only the edits made on disk since the content last read or saved are
+        applied, rebased onto the room: edits made in the room meanwhile are
+        kept, and win over the disk edits they overlap. The edits are applied
+        as one change, broadcast to the clients like any other change.
+        """
+        base, self.disk_text = self.disk_text, text
+        if text == base:
+            return
+        edits = merge_diff(base, textarea.get_text(self.document), text)
+        if not edits:
+            return
+        log.info(f'Reconciling room {self.room} with {len(edits)} edit(s)')
+        self.document, change, patch = textarea.splice_text(self.document, edits)
+        self.change_applied(change, patch)
+        message = self.codec.dumps({
+            'action': 'change',
+            'changes': [change],
+            'baseline': self.baseline,
+        })
+        self.broadcast_to_users(message)
+        if self.should_compact_history():
+            self.compact_history()
+
+
+    def all_changes_payload(self, action='all_changes'):
+        return {
+            'action': action,
+            'changes': self.get_all_changes(),
+            'baseline': self.baseline,
+        }
+
+
+    def get_all_changes_message(self):
+        """Return the `all_changes` message of the room, encoded once per room version."""
+        version, message = self.all_changes_message
+        if version != self.version:
+            message = self.codec.dumps(self.all_changes_payload())
+            self.all_changes_message = (self.version, message)
+        return message
+
+
+    async def encode_all_changes(self, action, retries=2):
+        """Return the messages bringing a joining client up to date, with the
+        changes of the room encoded off the IOLoop when they are large.
+
+        The room may change while they are encoded: they are encoded again,
+        up to `retries` times, then the last encoding is followed by a
+        `change` message with the changes made since. If the history was
+        compacted meanwhile, the new baseline is small and is encoded on the
+        IOLoop instead.
+        """
+        for _ in range(retries + 1):
+            version = self.version
+            payload = self.all_changes_payload(action)
+            message = await self.codec.dumps_async(payload, estimate_changes_bytes(payload['changes']))
+            if self.version == version:
+                return [message]
+        if self.baseline != version[0]:
+            return [self.codec.dumps(self.all_changes_payload(action))]
+        since = self.get_all_changes()[len(payload['changes']):]
+        return [message, self.codec.dumps({
+            'action': 'change',
+            'changes': since,
+            'baseline': self.baseline,
+        })]
+
+
+    def send_all_changes(self, ws):
+        ws.send(self.room, self.get_all_changes_message())
+
+
+    def admit(self, size, limiter):
+        """Return 0 and take the tokens if a message of `size` bytes fits both
+        the connection `limiter` and the room limits, else the seconds to wait."""
+        delay = max(limiter.delay(size), self.limiter.delay(size))
+        if delay == 0:
+            limiter.consume(size)
+            self.limiter.consume(size)
+        return delay
+
+
+    def reject(self, ws, reason, count=1):
+        """Drop messages of `ws` and resync it with the state of the room."""
+        self.metrics[reason] += count
+        log.warning(f'Rejected {count} message(s) in room {self.room}: {reason}')
+        self.send_all_changes(ws)
+
+
     def add_websocket(self, ws):
-        self.websockets.append(ws)
+        if ws.role == 'viewer':
+            self.viewers.add(ws)
+        else:
+            self.websockets.append(ws)
 
 
     def remove_websocket(self, ws):
-        self.websockets.remove(ws)
+        if ws in self.viewers:
+            self.viewers.remove(ws)
+        elif ws in self.websockets:
+            self.websockets.remove(ws)
 
 
     def broadcast_to_users(self, message, sender=None):
         for ws in self.websockets:
             if ws != sender:
-                ws.write_message(message)
+                ws.send(self.room, message)
+        self.viewers.broadcast(self.room, message, self.send_all_changes)
+
+
+    def process_viewer_message(self, message, sender):
+        """Viewers can only ask for a resync, anything else they send is dropped."""
+        m = self.codec.loads(message)
+        if m.get('action') == 'get_all_changes':
+            self.send_all_changes(sender)
+        else:
+            self.metrics['viewer_messages_dropped'] += 1
 
     def process_message(self, message, sender=None):
-        m = json.loads(message)
-        print(f'process_message: {m}')
+        m = self.codec.loads(message)
         action = m['action']
+        log.debug('Room %s received a %s message', self.room, action)
         if action == 'get_all_changes':
-            changes = self.get_all_changes()
-            message = json.dumps({'action': 'all_changes', 'changes': changes})
-            sender.write_message(message)
+            self.send_all_changes(sender)
             return
         if action == 'change':
+            if m.get('baseline', self.baseline) != self.baseline:
+                # The change was built on a history that has been compacted.
+                self.send_all_changes(sender)
+                return
             m_bytes = list(m['changes'][0].values())
-            self.document = textarea.apply_changes(self.document, m_bytes)
+            if change_hash(m_bytes) in self.change_hashes:
+                # Already applied, e.g. resent by a client after a reconnection.
+                self.metrics['duplicate_changes'] += 1
+                return
+            if self.max_change_bytes and len(m_bytes) > self.max_change_bytes:
+                self.reject(sender, 'oversize_changes')
+                return
+            patch = None
+            if self.observers:
+                document, patch, applied = textarea.apply_changes_with_patch(self.document, m_bytes)
+            else:
+                document, applied = textarea.apply_changes(self.document, m_bytes)
+            # A change whose dependencies are missing is queued by automerge
+            # and dropped when the document is saved, so it was not applied
+            # and must be accepted when it is sent again.
+            if not applied:
+                self.metrics['missing_deps_changes'] += 1
+                return
+            self.document = document
+            self.change_applied(m_bytes, patch)
         self.broadcast_to_users(message, sender)
+        if self.should_compact_history():
+            self.compact_history()
 
 
 class DefaultHandler(ExtensionHandlerMixin, JupyterHandler):
@@ -74,6 +353,44 @@ class ExampleHandler(APIHandler):
         }))
 
 
+class RoomsHandler(APIHandler):
+    @tornado.web.authenticated
+    def get(self):
+        self.finish(json.dumps([
+            dict(room.memory_usage(), metrics=dict(room.metrics))
+            for room in rooms.values()
+        ]))
+
+
+class HistoryHandler(APIHandler):
+    @tornado.web.authenticated
+    def get(self):
+        room = self.get_argument('room')
+        if room not in rooms:
+            raise tornado.web.HTTPError(404, f'No room {room}')
+        change = self.get_argument('change', default=None)
+        timestamp = self.get_argument('timestamp', default=None)
+        if change is None and timestamp is None:
+            raise tornado.web.HTTPError(400, 'Pass either a change or a timestamp')
+        try:
+            document = rooms[room].get_document_at(
+                change_index=None if change is None else int(change),
+                timestamp=None if timestamp is None else float(timestamp),
+            )
+        except (IndexError, ValueError) as e:
+            raise tornado.web.HTTPError(400, str(e))
+        self.finish(json.dumps({'room': room, 'text': textarea.get_text(document)}))
+
+
+class SnapshotDictionaryHandler(ExtensionHandlerMixin, JupyterHandler):
+    @tornado.web.authenticated
+    def get(self):
+        compressor = self.extensionapp.snapshot_compressor
+        self.set_header('Content-Type', 'application/octet-stream')
+        self.set_header('X-Dictionary-Id', compressor.dictionary_id.hex())
+        self.finish(compressor.dictionary)
+
+
 class WsRTCManager(WebSocketMixin, WebSocketHandler, ExtensionHandlerMixin, JupyterHandler):
 
 
@@ -81,44 +398,229 @@ class WsRTCManager(WebSocketMixin, WebSocketHandler, ExtensionHandlerMixin, Jupy
     USERS_ROOM = '_users_'
 
 
+    @property
+    def room_options(self):
+        app = self.extensionapp
+        return {
+            'history_max_changes': app.history_max_changes,
+            'history_window': app.history_window,
+            'messages_per_second': app.room_messages_per_second,
+            'bytes_per_second': app.room_bytes_per_second,
+            'max_change_bytes': app.max_change_bytes,
+            'viewer_max_pending': app.viewer_max_pending,
+            'history_dir': app.history_dir,
+            'checkpoint_interval': app.checkpoint_interval,
+            'checkpoint_byte_budget': app.checkpoint_byte_budget,
+            'checkpoint_cache_size': app.checkpoint_cache_size,
+            'codec': app.message_codec,
+        }
+
+
+    def get_compression_options(self):
+        # Negotiated permessage-deflate. The window size follows what the
+        # client offers, mem_level bounds the deflate state per connection.
+        # Viewers are not compressed: a deflate pass per viewer and message
+        # would make the broadcast cost grow with the audience.
+        app = self.extensionapp
+        if app.websocket_compression_level <= 0:
+            return None
+        if self.get_argument('role', default='editor') == 'viewer':
+            return None
+        return {
+            'compression_level': app.websocket_compression_level,
+            'mem_level': app.websocket_compression_mem_level,
+        }
+
+
     async def open(self):
-        room = self.get_argument('room', default=self.DEFAULT_ROOM)
         print(f"WebSocket open {self.request}, {self.request.remote_ip}")
+        app = self.extensionapp
+        self.limiter = RateLimiter(app.messages_per_second, app.bytes_per_second)
+        self.pending = deque()
+        self.pending_timeout = None
+        self.subscriptions = set()
+        # Viewers get the messages of their rooms but cannot change them.
+        self.role = self.get_argument('role', default='editor')
+        if self.role not in ('editor', 'viewer'):
+            raise tornado.web.HTTPError(400, f'Unknown role {self.role}')
+        self.snapshot_codec = negotiate_codec(self.get_argument('snapshot', default=None))
+        # A multiplexed connection serves any number of rooms. Each frame is
+        # prefixed with its room id and a newline; frames with an empty room
+        # id are subscribe and unsubscribe requests. Otherwise the connection
+        # serves the single room given in the query.
+        self.multiplexed = self.get_argument('multiplex', default=None) is not None
+        self.room = None
+        if not self.multiplexed:
+            self.room = self.get_argument('room', default=self.DEFAULT_ROOM)
+            await self.subscribe(self.room)
+
+
+    def frame(self, room, message, binary=False):
+        if not self.multiplexed:
+            return message
+        if binary:
+            return room.encode() + b'\n' + message
+        return room + '\n' + message
+
+
+    def send(self, room, message, binary=False):
+        self.write_message(self.frame(room, message, binary), binary=binary)
+
+
+    async def subscribe(self, room):
+        """Join `room`. If it cannot be loaded, e.g. its file does not exist or
+        is not text, the client is sent an `error` control frame instead;
+        the other rooms of a multiplexed connection are not affected."""
+        if room in self.subscriptions:
+            return
+        try:
+            await self.join(room)
+        except Exception as e:
+            self.subscriptions.discard(room)
+            if room in rooms:
+                rooms[room].remove_websocket(self)
+            if isinstance(e, tornado.web.HTTPError):
+                reason = e.log_message or e.reason or str(e)
+                log.warning(f'Cannot join room {room}: {reason}')
+            else:
+                reason = str(e)
+                log.exception(f'Cannot join room {room}')
+            message = self.extensionapp.message_codec.dumps(
+                {'action': 'error', 'room': room, 'reason': reason})
+            self.send('', message)
+            if not self.multiplexed:
+                self.close(reason=f'Cannot join room {room}')
+
+
+    async def join(self, room):
         if room == self.USERS_ROOM:
             if room not in rooms:
-                rooms[room] = Room(room, '')
+                rooms[room] = Room(room, '', **self.room_options)
+            self.subscriptions.add(room)
             rooms[room].add_websocket(self)
-            message = json.dumps({'action': 'ack'})
-            self.write_message(message)
+            self.send(room, rooms[room].codec.dumps({'action': 'ack'}))
             return
         action = 'change'
         if room not in rooms:
             action = 'init'
             content = self.get_content(room)
-            rooms[room] = Room(room, content)
+            rooms[room] = Room(room, content, **self.room_options)
+            self.extensionapp.file_watcher.watch(room)
+        # Subscribed once the room is loaded, so a room that failed to load
+        # does not stay behind.
+        self.subscriptions.add(room)
+        app = self.extensionapp
+        if self.snapshot_codec and len(rooms[room].document) >= app.snapshot_min_bytes:
+            rooms[room].add_websocket(self)
+            snapshot = rooms[room].get_snapshot(app.snapshot_compressor, self.snapshot_codec)
+            self.send(room, snapshot, binary=True)
+            return
+        if self.role == 'viewer':
+            rooms[room].add_websocket(self)
+            rooms[room].send_all_changes(self)
+            return
+        messages = await rooms[room].encode_all_changes(action)
+        # Joined only once the messages are encoded, so the changes broadcast
+        # meanwhile are not sent before them.
+        if room not in self.subscriptions or room not in rooms:
+            return
         rooms[room].add_websocket(self)
-        print(f"Websocket open {room}: {rooms[room].document}")
-        changes = rooms[room].get_all_changes()
-        message = json.dumps({'action': action, 'changes': changes})
-        self.write_message(message)
+        log.debug(f'Websocket subscribed to {room}')
+        for message in messages:
+            self.send(room, message)
 
 
-    def on_message(self, message,  *args, **kwargs):
-        room = self.get_argument('room', default=self.DEFAULT_ROOM)
-        if room == self.USERS_ROOM:
-            rooms[room].broadcast_to_users(message, sender=self)
+    def unsubscribe(self, room):
+        if room not in self.subscriptions:
             return
-        if room not in rooms:
-            print(f"WEIRD on_message: {room} is not in rooms")
+        self.subscriptions.discard(room)
+        if room in rooms:
+            rooms[room].remove_websocket(self)
+
+
+    async def on_message(self, message,  *args, **kwargs):
+        if self.multiplexed:
+            room, _, message = message.partition('\n')
+            if not room:
+                await self.on_control_message(message)
+                return
+        else:
+            room = self.room
+        # E.g. sent before the room was joined, or after joining it failed.
+        if room not in self.subscriptions or room not in rooms:
+            log.debug(f'Dropped a message for room {room}, which is not subscribed')
+            return
+        self.pending.append((room, message))
+        if self.pending_timeout is None:
+            self.process_pending()
+
+
+    async def on_control_message(self, message):
+        m = self.extensionapp.message_codec.loads(message)
+        action = m['action']
+        if action == 'subscribe':
+            for room in m['rooms']:
+                await self.subscribe(room)
+        elif action == 'unsubscribe':
+            for room in m['rooms']:
+                self.unsubscribe(room)
+
+
+    def process_pending(self):
+        """Process the queued messages of this connection in order, as the rate limits admit them.
+
+        Messages over the limits are delayed up to `rate_limit_max_delay`.
+        Beyond that, or when too many messages are queued, the queue is
+        dropped and the client is resynced with the rooms it was sending to.
+        """
+        self.pending_timeout = None
+        app = self.extensionapp
+        while self.pending:
+            room, message = self.pending[0]
+            if room not in self.subscriptions:
+                self.pending.popleft()
+                continue
+            if self.role == 'viewer':
+                # Viewers do not change the room, so they only use up the
+                # tokens of their connection.
+                delay = self.limiter.delay(len(message))
+                if delay == 0:
+                    self.limiter.consume(len(message))
+            else:
+                delay = rooms[room].admit(len(message), self.limiter)
+            if delay == 0:
+                self.pending.popleft()
+                if self.role == 'viewer':
+                    rooms[room].process_viewer_message(message, sender=self)
+                elif room == self.USERS_ROOM:
+                    rooms[room].broadcast_to_users(message, sender=self)
+                else:
+                    rooms[room].process_message(message, sender=self)
+                continue
+            if math.isinf(delay):
+                self.pending.popleft()
+                rooms[room].reject(self, 'oversize_messages')
+                continue
+            if delay > app.rate_limit_max_delay or len(self.pending) > app.rate_limit_max_pending:
+                dropped = Counter(room for room, _ in self.pending)
+                self.pending.clear()
+                for room, count in dropped.items():
+                    if room in self.subscriptions:
+                        rooms[room].reject(self, 'rate_limited_rejected', count)
+                return
+            rooms[room].metrics['rate_limited_delayed'] += 1
+            self.pending_timeout = IOLoop.current().call_later(delay, self.process_pending)
             return
-        rooms[room].process_message(message, sender=self)
 
 
     def on_close(self,  *args, **kwargs):
-        room = self.get_argument('room', default=None)
-        print(f"WebSocket on_close for {room}")
-        if room in rooms:
-            rooms[room].remove_websocket(self)
+        print(f"WebSocket on_close for {self.subscriptions}")
+        if self.pending_timeout is not None:
+            IOLoop.current().remove_timeout(self.pending_timeout)
+            self.pending_timeout = None
+        self.pending.clear()
+        for room in list(self.subscriptions):
+            self.unsubscribe(room)
 
 
     def get_content(self, path):
@@ -0,0 +1,187 @@
+"""Checkpoint index to rebuild past states of a room document.
+
+The changes of a room are appended to a log on disk and the document is
+saved as a checkpoint every `interval` changes, or once `byte_budget` bytes
+of changes were logged since the last checkpoint. The state at a change is
+rebuilt from the closest checkpoint before it, replaying at most one
+interval of changes. Recently used checkpoints are kept in memory.
+
+Changes are numbered from the creation of the history. A compaction of the
+history starts a new baseline, which does not follow from the logged
+changes: it is logged as an empty entry, taking the next index, and
+checkpointed there, so changes are never replayed across baselines.
+
+The history of a room outlives the server: when the directory already holds
+one, its index is rebuilt from the log and the checkpoints, and the document
+the room was reopened with is recorded as a new baseline, as a compaction
+does. The states before it stay reachable.
+"""
+import bisect
+import glob
+import os
+import struct
+import time
+from collections import OrderedDict
+
+from jupyter_rtc_automerge import textarea
+
+
+# Each logged change is prefixed with its time and its length.
+_HEADER = struct.Struct('>dI')
+
+# Logged in place of a change to start a new baseline.
+_BASELINE = b''
+
+
+class CheckpointIndex:
+
+    def __init__(self, directory, document, change_index, interval=100, byte_budget=0, cache_size=8):
+        self.directory = directory
+        self.interval = interval
+        self.byte_budget = byte_budget
+        self.cache_size = max(1, cache_size)
+        self.cache = OrderedDict()
+        # Change index of each logged change is first_index + its position.
+        self.first_index = change_index
+        self.offsets = []
+        self.times = []
+        self.checkpoints = []
+        self.logged_bytes = 0
+        os.makedirs(directory, exist_ok=True)
+        self.log = open(os.path.join(directory, 'changes.log'), 'ab+')
+        if self.reload():
+            self.rebaseline(document)
+        else:
+            self.checkpoint(document)
+
+
+    @property
+    def last_index(self):
+        return self.first_index + len(self.offsets)
+
+
+    def close(self):
+        self.log.close()
+
+
+    def reload(self):
+        """Rebuild the index of a history left in the directory, returning whether there was one."""
+        checkpoints = sorted(
+            int(os.path.basename(path)[:-len('.automerge')])
+            for path in glob.glob(os.path.join(self.directory, '*.automerge'))
+        )
+        if not checkpoints:
+            self.log.truncate(0)
+            return False
+        self.log.seek(0)
+        offset = 0
+        while True:
+            header = self.log.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                break
+            timestamp, length = _HEADER.unpack(header)
+            if len(self.log.read(length)) < length:
+                break
+            self.offsets.append(offset)
+            self.times.append(timestamp)
+            offset = self.log.tell()
+        # Drop a change left half written by a crash.
+        self.log.truncate(offset)
+        self.first_index = checkpoints[0]
+        # A checkpoint past the log was saved for a baseline whose entry
+        # was not logged before a crash.
+        self.checkpoints = [index for index in checkpoints if index <= self.last_index]
+        return True
+
+
+    def checkpoint(self, document):
+        """Save `document`, the state at the last change, unless it is already saved."""
+        index = self.last_index
+        if self.checkpoints and self.checkpoints[-1] == index:
+            return
+        self.save(index, document)
+        self.checkpoints.append(index)
+        self.logged_bytes = 0
+
+
+    def rebaseline(self, document):
+        """Record `document`, which does not follow from the logged changes, as the next state."""
+        index = self.last_index + 1
+        self.save(index, document)
+        self.append(_BASELINE)
+        self.checkpoints.append(index)
+        self.logged_bytes = 0
+
+
+    def save(self, index, document):
+        path = self.checkpoint_path(index)
+        with open(path + '.tmp', 'wb') as fid:
+            fid.write(bytes(document))
+        os.replace(path + '.tmp', path)
+
+
+    def checkpoint_path(self, index):
+        return os.path.join(self.directory, f'{index:012d}.automerge')
+
+
+    def record(self, change, document):
+        """Log `change`, which turned the document into `document`."""
+        change = bytes(change)
+        self.append(change)
+        self.logged_bytes += len(change)
+        if (self.last_index - self.checkpoints[-1] >= self.interval
+                or (self.byte_budget and self.logged_bytes >= self.byte_budget)):
+            self.checkpoint(document)
+
+
+    def append(self, change):
+        self.log.seek(0, os.SEEK_END)
+        self.offsets.append(self.log.tell())
+        self.times.append(time.time())
+        self.log.write(_HEADER.pack(self.times[-1], len(change)))
+        self.log.write(change)
+        self.log.flush()
+
+
+    def index_at(self, timestamp):
+        """Return the index of the last change made at or before `timestamp`."""
+        return self.first_index + bisect.bisect_right(self.times, timestamp)
+
+
+    def load_checkpoint(self, index):
+        if index in self.cache:
+            self.cache.move_to_end(index)
+            return self.cache[index]
+        with open(self.checkpoint_path(index), 'rb') as fid:
+            document = fid.read()
+        self.cache[index] = document
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return document
+
+
+    def read_changes(self, start, stop):
+        changes = []
+        for offset in self.offsets[start - self.first_index:stop - self.first_index]:
+            self.log.seek(offset)
+            _timestamp, length = _HEADER.unpack(self.log.read(_HEADER.size))
+            # A baseline is checkpointed, so it is only read when its
+            # checkpoint was lost in a crash: the state is then kept.
+            if length:
+                changes.append(self.log.read(length))
+        return changes
+
+
+    def get_document_at(self, change_index=None, timestamp=None):
+        """Return the document as it was after `change_index` changes, or at `timestamp`."""
+        if change_index is None:
+            change_index = self.index_at(timestamp)
+        if not self.first_index <= change_index <= self.last_index:
+            raise IndexError(
+                f'Change {change_index} is not in [{self.first_index}, {self.last_index}]')
+        position = bisect.bisect_right(self.checkpoints, change_index) - 1
+        checkpoint = self.checkpoints[position]
+        document = self.load_checkpoint(checkpoint)
+        if checkpoint == change_index:
+            return document
+        return textarea.apply_many_changes(document, self.read_changes(checkpoint, change_index))
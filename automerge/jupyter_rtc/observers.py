@@ -0,0 +1,78 @@
+"""Server side observers of the changes of a room, filtered by path.
+
+The automerge patch of a change is flattened once into `(path, diff)`
+entries: one per text or list the change edited, with its `edits`, and one
+per scalar value it set in a map. Paths are made of map keys and, in lists,
+of element indices. An observer of `textArea` only gets the entries at or
+below that path.
+"""
+import logging
+
+log = logging.getLogger(__name__)
+
+
+def split_path(path):
+    return tuple(key for key in path.split('/') if key)
+
+
+def is_object(diff):
+    return isinstance(diff, dict) and 'objectId' in diff
+
+
+def flatten_patch(diff, path=()):
+    """Yield the `(path, diff)` entries of an automerge patch diff.
+
+    A text or a list is a single entry, holding its edits and the values they
+    insert. Only the objects nested in it are flattened further.
+    """
+    if not is_object(diff):
+        yield path, diff
+        return
+    sequence = diff.get('type') in ('text', 'list')
+    if sequence or not diff.get('props'):
+        yield path, diff
+    for key, values in (diff.get('props') or {}).items():
+        for value in values.values():
+            if sequence and not is_object(value):
+                continue
+            yield from flatten_patch(value, path + (str(key),))
+
+
+class Observers:
+
+    def __init__(self):
+        self.observers = []
+
+
+    def __bool__(self):
+        return bool(self.observers)
+
+
+    def add(self, path, callback):
+        """Call `callback(room, patches)` for the changes touching `path`.
+
+        Returns a handle to give to `remove`.
+        """
+        observer = (split_path(path), callback)
+        self.observers.append(observer)
+        return observer
+
+
+    def remove(self, observer):
+        self.observers.remove(observer)
+
+
+    def notify(self, room, patch):
+        entries = [(path, diff) for path, diff in flatten_patch(patch.get('diffs'))]
+        for prefix, callback in list(self.observers):
+            patches = [
+                {'path': '/'.join(path), 'diff': diff}
+                for path, diff in entries
+                if path[:len(prefix)] == prefix
+            ]
+            if not patches:
+                continue
+            try:
+                callback(room, patches)
+            except Exception:
+                log.exception(f'Observer of {"/".join(prefix)} in room {room.room} failed')
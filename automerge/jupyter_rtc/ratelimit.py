@@ -0,0 +1,60 @@
+"""Token buckets used to admit messages per connection and per room."""
+import math
+import time
+
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `capacity`. A rate of 0 means unlimited."""
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.clock = clock
+        self.tokens = self.capacity
+        self.updated = clock()
+
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+
+    def delay(self, amount=1):
+        """Return the seconds to wait before `amount` tokens are available, inf if never."""
+        if self.rate <= 0:
+            return 0
+        if amount > self.capacity:
+            return math.inf
+        self._refill()
+        if self.tokens >= amount:
+            return 0
+        return (amount - self.tokens) / self.rate
+
+
+    def consume(self, amount=1):
+        if self.rate <= 0:
+            return
+        self._refill()
+        self.tokens -= amount
+
+
+class RateLimiter:
+    """Limits both the number of messages and the number of bytes per second."""
+
+    def __init__(self, messages_per_second=0, bytes_per_second=0, burst_seconds=1, clock=time.monotonic):
+        # A burst holds at least one message, or a rate below one message
+        # per second would reject every message as oversized.
+        self.messages = TokenBucket(
+            messages_per_second, max(1, messages_per_second * burst_seconds), clock=clock)
+        self.bytes = TokenBucket(
+            bytes_per_second, bytes_per_second * burst_seconds, clock=clock)
+
+
+    def delay(self, size):
+        return max(self.messages.delay(1), self.bytes.delay(size))
+
+
+    def consume(self, size):
+        self.messages.consume(1)
+        self.bytes.consume(size)
@@ -0,0 +1,189 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip('jupyter_server')
+textarea = pytest.importorskip('jupyter_rtc_automerge').textarea
+
+import tornado.web
+
+from jupyter_rtc import handlers
+from jupyter_rtc.codec import MessageCodec
+from jupyter_rtc.handlers import WsRTCManager
+
+from .test_room import change_message
+
+
+def make_app():
+    return SimpleNamespace(
+        messages_per_second=0,
+        bytes_per_second=0,
+        room_messages_per_second=0,
+        room_bytes_per_second=0,
+        history_max_changes=0,
+        history_window=0,
+        max_change_bytes=0,
+        viewer_max_pending=16,
+        history_dir='',
+        checkpoint_interval=100,
+        checkpoint_byte_budget=0,
+        checkpoint_cache_size=8,
+        message_codec=MessageCodec(),
+        file_watcher=SimpleNamespace(watch=lambda path: None),
+        snapshot_min_bytes=0,
+        snapshot_compressor=None,
+        rate_limit_max_delay=1,
+        rate_limit_max_pending=100,
+    )
+
+
+class Connection(WsRTCManager):
+    """Runs the protocol of a websocket connection, without a server."""
+
+    extensionapp = None
+
+    def __init__(self, app, files, **query):
+        self.extensionapp = app
+        self.files = files
+        self.query = query
+        self.request = SimpleNamespace(remote_ip='127.0.0.1')
+        self.frames = []
+        self.close_reason = None
+
+    def get_argument(self, name, default=None):
+        return self.query.get(name, default)
+
+    def get_content(self, path):
+        if path not in self.files:
+            raise tornado.web.HTTPError(404, f'No file {path}')
+        return self.files[path]
+
+    def write_message(self, message, binary=False):
+        self.frames.append(message)
+
+    def close(self, code=None, reason=None):
+        self.close_reason = reason
+
+    def received(self):
+        """Return and forget the `(room, message)` of the frames received."""
+        frames, self.frames = self.frames, []
+        if not self.multiplexed:
+            return [(self.room, json.loads(frame)) for frame in frames]
+        return [
+            (room, json.loads(message))
+            for room, _, message in (frame.partition('\n') for frame in frames)
+        ]
+
+    async def control(self, action, *rooms):
+        await self.on_message('\n' + json.dumps({'action': action, 'rooms': list(rooms)}))
+
+
+@pytest.fixture(autouse=True)
+def clear_rooms():
+    handlers.rooms.clear()
+    yield
+    handlers.rooms.clear()
+
+
+def change(room, index, insert):
+    _document, change, _patch = textarea.splice_text(
+        handlers.rooms[room].document, [(index, 0, insert)])
+    return change_message(handlers.rooms[room], change)
+
+
+def test_multiplexed_subscribe_and_framing():
+    app = make_app()
+    files = {'a': 'abc', 'b': 'xyz'}
+
+    async def run():
+        first = Connection(app, files, multiplex='1')
+        second = Connection(app, files, multiplex='1')
+        await first.open()
+        await second.open()
+        await first.control('subscribe', 'a', 'b')
+        await second.control('subscribe', 'b')
+        assert [(room, m['action']) for room, m in first.received()] == [('a', 'init'), ('b', 'init')]
+        assert [(room, m['action']) for room, m in second.received()] == [('b', 'change')]
+
+        await first.on_message('b\n' + change('b', 3, '!'))
+        assert textarea.get_text(handlers.rooms['b'].document) == 'xyz!'
+        assert first.received() == []
+        assert [(room, m['action']) for room, m in second.received()] == [('b', 'change')]
+
+        await first.on_message('a\n' + change('a', 0, '>'))
+        assert textarea.get_text(handlers.rooms['a'].document) == '>abc'
+        assert second.received() == []
+
+    asyncio.run(run())
+
+
+def test_multiplexed_unsubscribe():
+    app = make_app()
+    files = {'a': 'abc'}
+
+    async def run():
+        first = Connection(app, files, multiplex='1')
+        second = Connection(app, files, multiplex='1')
+        for connection in (first, second):
+            await connection.open()
+            await connection.control('subscribe', 'a')
+            connection.received()
+        await first.control('unsubscribe', 'a')
+        assert first not in handlers.rooms['a'].websockets
+
+        await second.on_message('a\n' + change('a', 3, 'd'))
+        assert first.received() == []
+        # Frames for a room left are dropped.
+        await first.on_message('a\n' + change('a', 4, 'e'))
+        assert textarea.get_text(handlers.rooms['a'].document) == 'abcd'
+
+    asyncio.run(run())
+
+
+def test_failed_subscribe_does_not_affect_the_other_rooms():
+    app = make_app()
+
+    async def run():
+        connection = Connection(app, {'a': 'abc'}, multiplex='1')
+        await connection.open()
+        await connection.control('subscribe', 'missing', 'a')
+        (control, error), (room, init) = connection.received()
+        assert (control, error['action'], error['room']) == ('', 'error', 'missing')
+        assert (room, init['action']) == ('a', 'init')
+        assert connection.subscriptions == {'a'}
+        assert connection.close_reason is None
+
+        await connection.on_message('missing\n' + json.dumps({'action': 'get_all_changes'}))
+        assert connection.received() == []
+
+    asyncio.run(run())
+
+
+def test_single_room_connection():
+    app = make_app()
+
+    async def run():
+        connection = Connection(app, {'a': 'abc'}, room='a')
+        await connection.open()
+        assert [m['action'] for _room, m in connection.received()] == ['init']
+        await connection.on_message(change('a', 3, 'd'))
+        assert textarea.get_text(handlers.rooms['a'].document) == 'abcd'
+
+    asyncio.run(run())
+
+
+def test_messages_after_a_failed_single_room_join_are_dropped():
+    app = make_app()
+
+    async def run():
+        connection = Connection(app, {}, room='missing')
+        await connection.open()
+        assert [m['action'] for _room, m in connection.received()] == ['error']
+        assert connection.close_reason == 'Cannot join room missing'
+        # Frames already in flight when the connection is closed.
+        await connection.on_message(json.dumps({'action': 'get_all_changes'}))
+        assert connection.received() == []
+
+    asyncio.run(run())
@@ -0,0 +1,68 @@
+import random
+
+from jupyter_rtc.diff import apply_diff, merge_diff, text_diff
+
+
+def test_text_diff():
+    a = 'first line\nsecond line\nthird line\n'
+    b = 'first line\nsecond changed line\nthird line\nfourth line\n'
+    edits = text_diff(a, b)
+    assert apply_diff(a, edits) == b
+    assert text_diff(a, a) == []
+
+
+def test_merge_keeps_edits_made_after_a_save():
+    saved = 'hello world\n'
+    room = 'hello world, and more\n'
+    assert merge_diff(saved, room, saved) == []
+
+
+def test_merge_rebases_external_edits():
+    base = 'one\ntwo\nthree\n'
+    ours = 'zero\none\ntwo\nthree\n'
+    theirs = 'one\ntwo\nthree\nfour\n'
+    edits = merge_diff(base, ours, theirs)
+    assert apply_diff(ours, edits) == 'zero\none\ntwo\nthree\nfour\n'
+
+
+def test_merge_conflicts_keep_the_room():
+    base = 'one\ntwo\nthree\n'
+    ours = 'one\n2\nthree\n'
+    theirs = 'one\ndeux\nthree\n'
+    assert merge_diff(base, ours, theirs) == []
+
+
+def test_merge_identical_edits():
+    base = 'one\ntwo\n'
+    both = 'one\ntwo\nthree\n'
+    assert apply_diff(both, merge_diff(base, both, both)) == both
+
+
+def test_merge_never_applies_part_of_an_edit():
+    base = '\nbbabbabb\nabb\n'
+    ours = base[:13]
+    theirs = base[:5] + base[8:]
+    assert text_diff(base, theirs) == [(6, 0, '\n'), (10, 4, '')]
+    assert apply_diff(ours, merge_diff(base, ours, theirs)) in (ours, '\nbbabb\nabb')
+
+
+def test_merge_non_overlapping_edits():
+    rng = random.Random(0)
+    alphabet = 'abcdefgh\n'
+
+    def edit(start, stop):
+        index = rng.randint(start, stop)
+        remove = rng.randint(0, stop - index)
+        insert = ''.join(rng.choice(alphabet) for _ in range(rng.randrange(4)))
+        return index, remove, insert
+
+    for _ in range(2000):
+        base = ''.join(rng.choice(alphabet) for _ in range(rng.randrange(60)))
+        cut = rng.randint(0, len(base))
+        first, second = edit(0, cut), edit(cut, len(base))
+        both = apply_diff(base, [first, second])
+        if rng.random() < 0.5:
+            first, second = second, first
+        ours, theirs = apply_diff(base, [first]), apply_diff(base, [second])
+        # Either both edits, or ours alone when they touch: never a part.
+        assert apply_diff(ours, merge_diff(base, ours, theirs)) in (both, ours)
@@ -0,0 +1,104 @@
+import pytest
+
+textarea = pytest.importorskip('jupyter_rtc_automerge').textarea
+
+from jupyter_rtc.history import CheckpointIndex
+
+
+def edit(history, document, texts, index, remove, insert):
+    document, change, _patch = textarea.splice_text(document, [(index, remove, insert)])
+    history.record(change, document)
+    text = texts[-1]
+    texts.append(text[:index] + insert + text[index + remove:])
+    return document
+
+
+def assert_states(history, texts):
+    for index, text in enumerate(texts):
+        assert textarea.get_text(history.get_document_at(index)) == text
+
+
+def test_apply_many_changes():
+    document = textarea.new_document('room', 'abc')
+    base = document
+    document, first, _patch = textarea.splice_text(document, [(3, 0, 'd')])
+    document, second, _patch = textarea.splice_text(document, [(0, 1, '')])
+    assert textarea.get_text(textarea.apply_many_changes(base, [first, second])) == 'bcd'
+    assert textarea.get_text(textarea.apply_many_changes(base, [])) == 'abc'
+
+
+def test_replay_across_checkpoints(tmp_path):
+    document = textarea.new_document('room', 'abc')
+    history = CheckpointIndex(str(tmp_path), document, 0, interval=3)
+    texts = ['abc']
+    for i in range(8):
+        document = edit(history, document, texts, len(texts[-1]), 0, str(i))
+    assert history.checkpoints == [0, 3, 6]
+    assert_states(history, texts)
+    with pytest.raises(IndexError):
+        history.get_document_at(len(texts))
+
+
+def test_byte_budget_checkpoints(tmp_path):
+    document = textarea.new_document('room', '')
+    history = CheckpointIndex(str(tmp_path), document, 0, interval=100, byte_budget=1)
+    texts = ['']
+    for i in range(3):
+        document = edit(history, document, texts, 0, 0, 'x')
+    assert history.checkpoints == [0, 1, 2, 3]
+    assert_states(history, texts)
+
+
+def test_replay_across_baselines(tmp_path):
+    document = textarea.new_document('room', 'abc')
+    history = CheckpointIndex(str(tmp_path), document, 0, interval=100)
+    texts = ['abc']
+    document = edit(history, document, texts, 3, 0, 'def')
+    document = edit(history, document, texts, 0, 1, '')
+    # A compaction starts a new document, whose changes cannot be applied
+    # to the checkpoints of the previous one.
+    document = textarea.new_document('room', texts[-1])
+    history.rebaseline(document)
+    texts.append(texts[-1])
+    document = edit(history, document, texts, 0, 0, 'a')
+    document = edit(history, document, texts, 6, 0, '!')
+    assert history.checkpoints == [0, 3]
+    assert_states(history, texts)
+
+
+def test_index_at(tmp_path):
+    document = textarea.new_document('room', '')
+    history = CheckpointIndex(str(tmp_path), document, 5)
+    texts = ['']
+    assert history.index_at(0) == 5
+    document = edit(history, document, texts, 0, 0, 'a')
+    document = edit(history, document, texts, 1, 0, 'b')
+    history.times = [10.0, 20.0]
+    assert history.index_at(15) == 6
+    assert history.index_at(20) == 7
+    assert textarea.get_text(history.get_document_at(timestamp=15)) == 'a'
+
+
+# The last change before the restart is checkpointed, or not.
+@pytest.mark.parametrize('changes', [2, 3])
+def test_history_is_kept_across_restarts(tmp_path, changes):
+    document = textarea.new_document('room', 'abc')
+    history = CheckpointIndex(str(tmp_path), document, 0, interval=2)
+    texts = ['abc']
+    for i in range(changes):
+        document = edit(history, document, texts, 0, 0, str(i))
+    times = list(history.times)
+    checkpoints = list(history.checkpoints)
+    history.close()
+    # A crash in the middle of logging a change leaves it half written.
+    with open(tmp_path / 'changes.log', 'ab') as fid:
+        fid.write(b'\0\0')
+
+    document = textarea.new_document('room', 'reopened')
+    history = CheckpointIndex(str(tmp_path), document, 0, interval=2)
+    # The reopened document is a new baseline after the last change.
+    assert history.times[:-1] == times
+    assert history.checkpoints == checkpoints + [changes + 1]
+    texts.append('reopened')
+    document = edit(history, document, texts, 8, 0, '!')
+    assert_states(history, texts)
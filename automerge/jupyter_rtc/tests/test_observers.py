@@ -0,0 +1,88 @@
+from jupyter_rtc.observers import Observers, flatten_patch
+
+
+def text_diff(object_id, text):
+    return {
+        'objectId': object_id,
+        'type': 'text',
+        'edits': [
+            {'action': 'insert', 'index': i, 'elemId': f'{i + 2}@a'}
+            for i in range(len(text))
+        ],
+        'props': {
+            i: {f'{i + 2}@a': {'value': char}}
+            for i, char in enumerate(text)
+        },
+    }
+
+
+def notebook_patch():
+    cell = {
+        'objectId': '10@a',
+        'type': 'map',
+        'props': {
+            'cell_type': {'11@a': {'value': 'code'}},
+            'source': {'12@a': text_diff('12@a', 'x = 1')},
+        },
+    }
+    return {
+        'objectId': '_root',
+        'type': 'map',
+        'props': {
+            'textArea': {'1@a': text_diff('1@a', 'hello')},
+            'cells': {'9@a': {
+                'objectId': '9@a',
+                'type': 'list',
+                'edits': [{'action': 'insert', 'index': 0, 'elemId': '10@a'}],
+                'props': {0: {'10@a': cell}},
+            }},
+        },
+    }
+
+
+def test_flatten_patch():
+    entries = dict(flatten_patch(notebook_patch()))
+    assert sorted(entries) == [
+        ('cells',),
+        ('cells', '0', 'cell_type'),
+        ('cells', '0', 'source'),
+        ('textArea',),
+    ]
+    assert len(entries[('textArea',)]['edits']) == 5
+    assert len(entries[('cells', '0', 'source')]['edits']) == 5
+    assert entries[('cells', '0', 'cell_type')] == {'value': 'code'}
+
+
+def test_flatten_empty_patch():
+    assert list(flatten_patch({'objectId': '_root', 'type': 'map', 'props': {}})) == [
+        ((), {'objectId': '_root', 'type': 'map', 'props': {}}),
+    ]
+
+
+def test_observers_get_the_entries_below_their_path():
+    observers = Observers()
+    calls = []
+    observers.add('textArea', lambda room, patches: calls.append(('text', patches)))
+    observers.add('cells/0', lambda room, patches: calls.append(('cell', patches)))
+    observers.add('metadata', lambda room, patches: calls.append(('metadata', patches)))
+    observers.notify(None, {'diffs': notebook_patch()})
+
+    assert [name for name, _patches in calls] == ['text', 'cell']
+    text, cell = (patches for _name, patches in calls)
+    assert [patch['path'] for patch in text] == ['textArea']
+    assert sorted(patch['path'] for patch in cell) == ['cells/0/cell_type', 'cells/0/source']
+
+
+def test_failing_observer_does_not_stop_the_others():
+    class Room:
+        room = 'room'
+
+    def fail(room, patches):
+        raise RuntimeError('observer failed')
+
+    observers = Observers()
+    calls = []
+    observers.add('textArea', fail)
+    observers.add('textArea', lambda room, patches: calls.append(patches))
+    observers.notify(Room(), {'diffs': notebook_patch()})
+    assert len(calls) == 1
@@ -0,0 +1,57 @@
+import math
+
+from jupyter_rtc.ratelimit import RateLimiter, TokenBucket
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_delay_and_refill():
+    clock = Clock()
+    bucket = TokenBucket(10, 20, clock=clock)
+    assert bucket.delay(20) == 0
+    bucket.consume(20)
+    assert bucket.delay(5) == 0.5
+    clock.now = 0.5
+    assert bucket.delay(5) == 0
+    clock.now = 100
+    bucket.consume(0)
+    assert bucket.tokens == 20
+
+
+def test_token_bucket_oversize():
+    bucket = TokenBucket(10, 20, clock=Clock())
+    assert math.isinf(bucket.delay(21))
+
+
+def test_token_bucket_unlimited():
+    bucket = TokenBucket(0, clock=Clock())
+    bucket.consume(10 ** 9)
+    assert bucket.delay(10 ** 9) == 0
+
+
+def test_rate_limiter():
+    clock = Clock()
+    limiter = RateLimiter(messages_per_second=2, bytes_per_second=100, clock=clock)
+    limiter.consume(10)
+    limiter.consume(10)
+    assert limiter.delay(10) == 0.5
+    assert math.isinf(limiter.delay(101))
+    clock.now = 0.5
+    assert limiter.delay(10) == 0
+
+
+def test_rate_limiter_fractional_rate():
+    clock = Clock()
+    limiter = RateLimiter(messages_per_second=0.5, clock=clock)
+    assert limiter.delay(1) == 0
+    limiter.consume(1)
+    assert limiter.delay(1) == 2
+    clock.now = 2
+    assert limiter.delay(1) == 0
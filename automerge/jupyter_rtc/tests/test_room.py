@@ -0,0 +1,148 @@
+import asyncio
+import json
+
+import pytest
+
+pytest.importorskip('jupyter_server')
+textarea = pytest.importorskip('jupyter_rtc_automerge').textarea
+
+from jupyter_rtc.codec import MessageCodec
+from jupyter_rtc.handlers import Room, change_hash
+
+
+def change_message(room, change, baseline=None):
+    return json.dumps({
+        'action': 'change',
+        'changes': [{str(i): byte for i, byte in enumerate(change)}],
+        'baseline': room.baseline if baseline is None else baseline,
+    })
+
+
+def edit(room, index, remove, insert, sender=None):
+    _document, change, _patch = textarea.splice_text(room.document, [(index, remove, insert)])
+    room.process_message(change_message(room, change), sender)
+    return change
+
+
+class FakeWebsocket:
+    role = 'editor'
+
+    def __init__(self):
+        self.messages = []
+
+    def send(self, room, message, binary=False):
+        self.messages.append(json.loads(message))
+
+
+def test_change_with_missing_dependencies_is_not_indexed():
+    room = Room('room', 'abc')
+    document, first, _patch = textarea.splice_text(room.document, [(3, 0, 'd')])
+    document, second, _patch = textarea.splice_text(document, [(4, 0, 'e')])
+    count = room.changes_count
+
+    room.process_message(change_message(room, second))
+    assert room.changes_count == count
+    assert room.metrics['missing_deps_changes'] == 1
+
+    room.process_message(change_message(room, first))
+    room.process_message(change_message(room, second))
+    assert room.changes_count == count + 2
+    assert textarea.get_text(room.document) == 'abcde'
+
+    room.process_message(change_message(room, second))
+    assert room.metrics['duplicate_changes'] == 1
+    assert room.changes_count == len(room.get_all_changes())
+
+
+class RacingCodec(MessageCodec):
+    """Lets a client change the room while each of the first `races` encodings runs."""
+
+    def __init__(self, races):
+        super().__init__()
+        self.room = None
+        self.races = races
+
+    async def dumps_async(self, obj, size):
+        message = self.dumps(obj)
+        if self.races:
+            self.races -= 1
+            _doc, change, _patch = textarea.splice_text(self.room.document, [(0, 0, 'x')])
+            self.room.process_message(change_message(self.room, change))
+        return message
+
+
+def join_messages(races, retries=2):
+    codec = RacingCodec(races)
+    room = codec.room = Room('room', 'abc', codec=codec)
+    messages = asyncio.run(room.encode_all_changes('init', retries))
+    return room, [json.loads(message) for message in messages]
+
+
+def test_encode_all_changes_retries():
+    room, messages = join_messages(races=2)
+    assert [message['action'] for message in messages] == ['init']
+    assert len(messages[0]['changes']) == room.changes_count
+
+
+def test_encode_all_changes_sends_the_changes_made_meanwhile():
+    room, messages = join_messages(races=5)
+    assert [message['action'] for message in messages] == ['init', 'change']
+    init, change = messages
+    assert init['changes'] + change['changes'] == room.get_all_changes()
+
+
+def test_compaction_after_history_max_changes():
+    room = Room('room', 'abc')
+    room.history_max_changes = room.changes_count + 2
+    edit(room, 3, 0, 'd')
+    edit(room, 4, 0, 'e')
+    assert room.baseline == 0
+    edit(room, 5, 0, 'f')
+    assert room.baseline == 1
+    assert textarea.get_text(room.document) == 'abcdef'
+
+
+def test_compaction_waits_for_history_window():
+    room = Room('room', 'abc', history_max_changes=1, history_window=3600)
+    edit(room, 3, 0, 'd')
+    edit(room, 4, 0, 'e')
+    assert room.baseline == 0
+    room.baseline_time -= 3600
+    edit(room, 5, 0, 'f')
+    assert room.baseline == 1
+
+
+def test_compaction_rebuilds_the_baseline_and_hash_index():
+    room = Room('room', 'abc')
+    room.history_max_changes = room.changes_count + 1
+    ws = FakeWebsocket()
+    room.add_websocket(ws)
+    old = [edit(room, 3, 0, 'd'), edit(room, 4, 0, 'e')]
+    assert room.baseline == 1
+
+    changes = room.get_all_changes()
+    assert room.changes_count == len(changes)
+    assert room.change_hashes == {change_hash(c) for c in changes}
+    assert not room.change_hashes & {change_hash(c) for c in old}
+    assert textarea.get_text(room.document) == 'abcde'
+    # Every client is reloaded with the new baseline.
+    assert ws.messages[-1] == room.all_changes_payload()
+
+    edit(room, 5, 0, 'f')
+    assert textarea.get_text(room.document) == 'abcdef'
+    assert room.changes_count == len(changes) + 1
+
+
+def test_change_on_an_old_baseline_is_answered_with_a_resync():
+    room = Room('room', 'abc')
+    room.history_max_changes = room.changes_count + 1
+    edit(room, 3, 0, 'd')
+    edit(room, 4, 0, 'e')
+    assert room.baseline == 1
+    _document, change, _patch = textarea.splice_text(room.document, [(0, 0, 'x')])
+    ws = FakeWebsocket()
+
+    room.process_message(change_message(room, change, baseline=0), sender=ws)
+    assert ws.messages == [room.all_changes_payload()]
+    assert ws.messages[0]['baseline'] == 1
+    assert textarea.get_text(room.document) == 'abcde'
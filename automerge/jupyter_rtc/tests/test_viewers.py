@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('tornado')
+
+from tornado.websocket import WebSocketClosedError
+
+from jupyter_rtc.viewers import ViewerGroup
+
+
+class FakeViewer:
+    """Records the frames written, whose writes are flushed by `flush`."""
+
+    def __init__(self, multiplexed=False, closed=False):
+        self.multiplexed = multiplexed
+        self.closed = closed
+        self.frames = []
+        self.futures = []
+        self.framed = 0
+
+    def frame(self, room, message):
+        self.framed += 1
+        return room + '\n' + message if self.multiplexed else message
+
+    def write_message(self, frame, binary=False):
+        if self.closed:
+            raise WebSocketClosedError()
+        self.frames.append(frame)
+        future = asyncio.get_event_loop().create_future()
+        self.futures.append(future)
+        return future
+
+    def flush(self):
+        for future in self.futures:
+            if not future.done():
+                future.set_result(None)
+
+
+async def settle():
+    # Lets the fan-out and the write callbacks run.
+    for _ in range(3):
+        await asyncio.sleep(0)
+
+
+def test_frames_are_encoded_once_per_kind_of_viewer():
+    async def run():
+        group = ViewerGroup()
+        viewers = [FakeViewer(), FakeViewer(), FakeViewer(multiplexed=True), FakeViewer(multiplexed=True)]
+        for viewer in viewers:
+            group.add(viewer)
+        group.broadcast('room', 'message', resync=None)
+        await settle()
+        return viewers
+
+    viewers = asyncio.run(run())
+    assert [viewer.frames for viewer in viewers] == [[b'message']] * 2 + [[b'room\nmessage']] * 2
+    assert sum(viewer.framed for viewer in viewers) == 2
+
+
+def test_lagging_viewer_is_skipped_then_resynced():
+    resynced = []
+
+    async def run():
+        group = ViewerGroup(max_pending=2)
+        slow, fast = FakeViewer(), FakeViewer()
+        group.add(slow)
+        group.add(fast)
+        for i in range(4):
+            group.broadcast('room', str(i), resynced.append)
+            await settle()
+            fast.flush()
+            await settle()
+        assert slow.frames == [b'0', b'1']
+        assert fast.frames == [b'0', b'1', b'2', b'3']
+        assert group.lagging == {slow}
+        assert resynced == []
+
+        slow.flush()
+        await settle()
+        assert resynced == [slow]
+        assert group.lagging == set()
+        group.broadcast('room', '4', resynced.append)
+        await settle()
+        assert slow.frames[-1] == b'4'
+
+    asyncio.run(run())
+
+
+def test_closed_viewer_is_removed():
+    async def run():
+        group = ViewerGroup()
+        closed = FakeViewer(closed=True)
+        group.add(closed)
+        group.broadcast('room', 'message', resync=None)
+        await settle()
+        assert closed not in group
+        assert len(group) == 0
+
+    asyncio.run(run())
+
+
+def test_removed_viewer_is_not_resynced():
+    resynced = []
+
+    async def run():
+        group = ViewerGroup(max_pending=1)
+        viewer = FakeViewer()
+        group.add(viewer)
+        group.broadcast('room', '0', resynced.append)
+        group.broadcast('room', '1', resynced.append)
+        await settle()
+        assert group.lagging == {viewer}
+        group.remove(viewer)
+        viewer.flush()
+        await settle()
+
+    asyncio.run(run())
+    assert resynced == []
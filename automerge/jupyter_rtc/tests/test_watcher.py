@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('tornado')
+
+from jupyter_rtc.watcher import FileWatcher
+
+
+def watch(tmp_path, steps, **options):
+    """Run `steps(watcher, calls)` against a started watcher of `tmp_path/file`."""
+    calls = []
+
+    async def run():
+        watcher = FileWatcher(str(tmp_path), calls.append, use_inotify=False, **options)
+        watcher.start()
+        watcher.watch('file')
+        try:
+            await steps(watcher, calls)
+        finally:
+            watcher.stop()
+
+    asyncio.run(run())
+    return calls
+
+
+def test_bursts_are_debounced(tmp_path):
+    async def steps(watcher, calls):
+        for i in range(3):
+            (tmp_path / 'file').write_text('x' * (i + 1))
+            watcher.touched('file')
+            await asyncio.sleep(0.02)
+        assert calls == []
+        await asyncio.sleep(0.2)
+
+    # Polling is too slow to see the burst: only the touches report it.
+    assert watch(tmp_path, steps, debounce=0.1, poll_interval=60) == ['file']
+
+
+def test_unchanged_file_is_not_reported(tmp_path):
+    (tmp_path / 'file').write_text('x')
+
+    async def steps(watcher, calls):
+        watcher.touched('file')
+        await asyncio.sleep(0.1)
+
+    assert watch(tmp_path, steps, debounce=0.02, poll_interval=60) == []
+
+
+def test_polling_settles_changes_faster_than_the_debounce(tmp_path):
+    async def steps(watcher, calls):
+        (tmp_path / 'file').write_text('x')
+        await asyncio.sleep(0.3)
+        assert calls == ['file']
+        (tmp_path / 'file').unlink()
+        await asyncio.sleep(0.3)
+        # Deleting is not reported, recreating is.
+        assert calls == ['file']
+        (tmp_path / 'file').write_text('y')
+        await asyncio.sleep(0.3)
+
+    assert watch(tmp_path, steps, debounce=0.1, poll_interval=0.01) == ['file', 'file']
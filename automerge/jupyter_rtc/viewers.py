@@ -0,0 +1,85 @@
+"""Read-only viewers of a room.
+
+Viewers do not take part in the merge work: they are sent a cached snapshot
+when they join, then the messages of the room as they were encoded for the
+editors. The fan-out runs in its own IOLoop callback, after the editors are
+served, and a viewer that does not keep up is skipped until its writes drain,
+then resynced with a snapshot.
+
+Each frame is encoded to UTF-8 once for the group, and viewer connections do
+not negotiate websocket compression, so the bytes written are the same for
+every viewer and no per-viewer deflate pass runs on the IOLoop.
+"""
+from tornado.ioloop import IOLoop
+from tornado.websocket import WebSocketClosedError
+
+
+class ViewerGroup:
+
+    def __init__(self, max_pending=16):
+        self.max_pending = max_pending
+        # Viewer websocket -> number of writes not flushed yet.
+        self.viewers = {}
+        self.lagging = set()
+
+
+    def __len__(self):
+        return len(self.viewers)
+
+
+    def __contains__(self, ws):
+        return ws in self.viewers
+
+
+    def add(self, ws):
+        self.viewers[ws] = 0
+
+
+    def remove(self, ws):
+        self.viewers.pop(ws, None)
+        self.lagging.discard(ws)
+
+
+    def broadcast(self, room, message, resync):
+        """Send `message` of `room` to every viewer that keeps up.
+
+        `resync(ws)` is called for a lagging viewer once its writes drained.
+        """
+        if self.viewers:
+            IOLoop.current().add_callback(self._fan_out, room, message, resync)
+
+
+    def _fan_out(self, room, message, resync):
+        # Frames only depend on whether the viewer is multiplexed, so each
+        # is encoded once for the whole group. Text frames are written as
+        # UTF-8 bytes, which tornado sends without encoding them again.
+        frames = {}
+        for ws in list(self.viewers):
+            if ws in self.lagging:
+                continue
+            if self.viewers[ws] >= self.max_pending:
+                self.lagging.add(ws)
+                continue
+            if ws.multiplexed not in frames:
+                frame = ws.frame(room, message)
+                frames[ws.multiplexed] = frame.encode() if isinstance(frame, str) else frame
+            self.write(ws, frames[ws.multiplexed], resync)
+
+
+    def write(self, ws, frame, resync, binary=False):
+        try:
+            future = ws.write_message(frame, binary=binary)
+        except WebSocketClosedError:
+            self.remove(ws)
+            return
+        self.viewers[ws] += 1
+        future.add_done_callback(lambda f: self._written(ws, resync))
+
+
+    def _written(self, ws, resync):
+        if ws not in self.viewers:
+            return
+        self.viewers[ws] -= 1
+        if ws in self.lagging and self.viewers[ws] == 0:
+            self.lagging.discard(ws)
+            resync(ws)
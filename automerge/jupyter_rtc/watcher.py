@@ -0,0 +1,147 @@
+"""Watch the files of the open rooms for changes made outside of the collaboration.
+
+inotify (through watchdog) is used when available, stat polling otherwise.
+Only the watched paths are indexed, so the cost does not depend on the
+number of files served.
+"""
+import os
+
+from tornado.ioloop import IOLoop, PeriodicCallback
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class FileWatcher:
+    """Call `callback(path)` once a burst of changes to a watched path has settled.
+
+    Paths are contents manager paths, relative to `root_dir`.
+    """
+
+    def __init__(self, root_dir, callback, debounce=0.2, poll_interval=2.0, use_inotify=True):
+        self.root_dir = root_dir
+        self.callback = callback
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        # Path -> (mtime, size) when last reported, None while the file is missing.
+        self.index = {}
+        self.pending = {}
+        self.loop = None
+        self.observer = None
+        self.poller = None
+        self.directories = {}
+        self.use_inotify = use_inotify and Observer is not None
+
+
+    def os_path(self, path):
+        return os.path.join(self.root_dir, path.lstrip('/'))
+
+
+    def start(self):
+        self.loop = IOLoop.current()
+        if self.use_inotify:
+            self.observer = Observer()
+            self.observer.start()
+        else:
+            self.poller = PeriodicCallback(self.poll, self.poll_interval * 1000)
+            self.poller.start()
+
+
+    def stop(self):
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer = None
+        if self.poller is not None:
+            self.poller.stop()
+            self.poller = None
+        for timeout in self.pending.values():
+            self.loop.remove_timeout(timeout)
+        self.pending.clear()
+
+
+    def watch(self, path):
+        if path in self.index:
+            return
+        self.index[path] = _stat(self.os_path(path))
+        if self.observer is not None:
+            directory = os.path.dirname(self.os_path(path))
+            if directory not in self.directories:
+                handler = _EventHandler(self)
+                self.directories[directory] = [
+                    self.observer.schedule(handler, directory, recursive=False), 0]
+            self.directories[directory][1] += 1
+
+
+    def unwatch(self, path):
+        if self.index.pop(path, False) is False:
+            return
+        timeout = self.pending.pop(path, None)
+        if timeout is not None:
+            self.loop.remove_timeout(timeout)
+        if self.observer is not None:
+            directory = os.path.dirname(self.os_path(path))
+            self.directories[directory][1] -= 1
+            if self.directories[directory][1] == 0:
+                self.observer.unschedule(self.directories.pop(directory)[0])
+
+
+    def poll(self):
+        for path, stat in list(self.index.items()):
+            # A pending change is settled against the index after the debounce:
+            # touching it again on every tick would postpone it forever when
+            # polling more often than the debounce.
+            if path not in self.pending and _stat(self.os_path(path)) != stat:
+                self.touched(path)
+
+
+    def touched(self, path):
+        """Debounce a change to `path`, restarting its delay on every new event."""
+        if path not in self.index:
+            return
+        timeout = self.pending.pop(path, None)
+        if timeout is not None:
+            self.loop.remove_timeout(timeout)
+        self.pending[path] = self.loop.call_later(self.debounce, self.settled, path)
+
+
+    def settled(self, path):
+        self.pending.pop(path, None)
+        if path not in self.index:
+            return
+        stat = _stat(self.os_path(path))
+        if stat == self.index[path]:
+            return
+        self.index[path] = stat
+        if stat is not None:
+            self.callback(path)
+
+
+if Observer is not None:
+
+    class _EventHandler(FileSystemEventHandler):
+        """Forwards the events of a directory to the watcher, from the observer thread."""
+
+        def __init__(self, watcher):
+            self.watcher = watcher
+
+
+        def on_any_event(self, event):
+            if event.is_directory:
+                return
+            for os_path in (event.src_path, getattr(event, 'dest_path', None)):
+                if not os_path:
+                    continue
+                relative = os.path.relpath(os_path, self.watcher.root_dir)
+                for path in (relative, '/' + relative):
+                    self.watcher.loop.add_callback(self.watcher.touched, path)
@@ -53,6 +53,7 @@ class TextAreaModel {
   private ws: WebSocket;
   private roomId: string;
   private uri: string;
+  private baseline = 0;
   
   constructor(fileEditor: FileEditor) { 
 
@@ -68,6 +69,9 @@ class TextAreaModel {
       if (message.data) {
         const data = JSON.parse(message.data);
         console.log('TextAreaModel Receiving', data);
+        if (data.baseline !== undefined) {
+          this.baseline = data.baseline;
+        }
         if (data.action === 'all_changes') {
           this.textArea = initTextArea();
           this.textArea = applyTextAreaChanges(this.textArea, data.changes);
@@ -119,7 +123,8 @@ class TextAreaModel {
         console.log('TextAreaModel Sending changes', changes);
         const payload = JSON.stringify({
           'action': 'change',
-          'changes': changes
+          'changes': changes,
+          'baseline': this.baseline
         });
         this.ws.send((payload as any));
       }
@@ -1,3 +1,36 @@
-# Import all from jupyter_rtc_automerge.
-from .jupyter_rtc_automerge import *
+# The native jupyter_rtc_automerge module, and its logger, are loaded on the
+# first use of one of its submodules, not when this package is imported.
+import importlib
+import os
 
+_native = None
+
+
+def _load():
+    global _native
+    if _native is None:
+        native = importlib.import_module('.jupyter_rtc_automerge', __name__)
+        native.init_logging(
+            os.environ.get('JUPYTER_RTC_AUTOMERGE_LOG', '/tmp/jupyter_rtc_automerge.log'))
+        _native = native
+    return _native
+
+
+class _LazySubmodule:
+
+    def __init__(self, name):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(getattr(_load(), self._name), attr)
+
+    def __dir__(self):
+        return dir(getattr(_load(), self._name))
+
+    def __repr__(self):
+        return f'<lazy submodule {__name__}.{self._name}>'
+
+
+textarea = _LazySubmodule('textarea')
+nb = _LazySubmodule('nb')
+automerge_map = _LazySubmodule('automerge_map')
@@ -11,7 +11,7 @@ use pyo3::prelude::*;
 use pyo3::type_object::PyTypeObject;
 use pyo3::types::{
     PyAny, PyBool, PyByteArray, PyBytes, PyDict, PyFloat, PyInt, PyList, PyLong, PyString,
-    PyUnicode,
+    PyTuple, PyUnicode,
 };
 use std::collections::HashMap;
 use std::os::raw::c_long;
@@ -24,17 +24,15 @@ struct AutomergeMap {
 #[pymethods]
 impl AutomergeMap {
     #[new]
-    fn new(py_struct: &PyDict) -> Self {
+    fn new(py_struct: &PyDict) -> PyResult<Self> {
         //  Convert from a PyDict to a Hashmap<Str : automerge_frontend::Value>
-        let hashmap_struct: std::result::Result<HashMap<String, &PyAny>, PyErr> = py_struct
-            .extract()
-            .and_then(|hashmap_struct| Ok(hashmap_struct));
+        let hashmap_struct: HashMap<String, &PyAny> = py_struct.extract()?;
 
-        let backend = base_document(hashmap_struct.unwrap());
+        let backend = base_document(hashmap_struct)?;
 
         let serialized_backend = backend.save().and_then(|data| Ok(data)).unwrap();
 
-        AutomergeMap { serialized_backend }
+        Ok(AutomergeMap { serialized_backend })
     }
 
     fn dump_backend(&self) {
@@ -123,7 +121,7 @@ impl AutomergeMap {
         // Create a "change" action, that sets the value for the given key
         let change = automerge_frontend::LocalChange::set(
             automerge_frontend::Path::root().key(key),
-            py_to_automerge_val(value),
+            py_to_automerge_val(value)?,
         );
         // Apply this change
         let change_request = frontend
@@ -215,8 +213,13 @@ fn automerge_primivite_to_py<'p>(
         automerge_protocol::ScalarValue::Boolean(b) => &PyBool::new(py, *b),
         automerge_protocol::ScalarValue::Null => unsafe { &(py.from_owned_ptr(ffi::Py_None())) },
 
+        // a string which is not a well formed buffer is read as a string
+        automerge_protocol::ScalarValue::Str(s) => match s.strip_prefix(BUFFER_PREFIX) {
+            Some(encoded) => buffer_to_py(py, encoded).unwrap_or_else(|_| PyString::new(py, s)),
+            None => PyString::new(py, s),
+        },
+
         // we're not supposed to store any of the following values in the backend
-        automerge_protocol::ScalarValue::Str(s) => PyString::new(py, "N/A"),
         automerge_protocol::ScalarValue::Uint(ui) => PyString::new(py, "N/A"),
         automerge_protocol::ScalarValue::F32(f) => PyString::new(py, "N/A"),
         automerge_protocol::ScalarValue::Counter(c) => PyString::new(py, "N/A"),
@@ -224,6 +227,73 @@ fn automerge_primivite_to_py<'p>(
     }
 }
 
+// Buffers (numpy arrays, bytes, ...) are stored as a single string scalar :
+// "<BUFFER_PREFIX><dtype>:<comma separated shape>:<base64 data>".
+// A scalar is an atomic value, so a whole array is one op instead of one op per element.
+// Python strings are stored as Text, so only buffers are written as string scalars here :
+// the NUL characters keep the string scalars of other clients from being read as buffers.
+const BUFFER_PREFIX: &str = "\u{0}automerge_buffer\u{0}";
+
+fn py_buffer_to_scalar(py: Python, py_value: &PyAny) -> PyResult<automerge_protocol::ScalarValue> {
+    // numpy arrays describe their own dtype, other buffers are read through a memoryview
+    let view = if py_value.hasattr("dtype")? {
+        py_value
+    } else {
+        py.import("builtins")?
+            .getattr("memoryview")?
+            .call1((py_value,))?
+    };
+    let dtype: String = if py_value.hasattr("dtype")? {
+        // the bytes of an object array are pointers to python objects
+        if view.getattr("dtype")?.getattr("hasobject")?.extract()? {
+            return Err(PyTypeError::new_err(
+                "arrays of python objects can not be stored, convert them to lists",
+            ));
+        }
+        view.getattr("dtype")?.getattr("str")?.extract()?
+    } else {
+        view.getattr("format")?.extract()?
+    };
+    let shape: std::vec::Vec<usize> = view.getattr("shape")?.extract()?;
+    let data: &PyBytes = view.call_method0("tobytes")?.downcast()?;
+    let shape_str = shape
+        .iter()
+        .map(|d| d.to_string())
+        .collect::<std::vec::Vec<String>>()
+        .join(",");
+    Ok(automerge_protocol::ScalarValue::Str(format!(
+        "{}{}:{}:{}",
+        BUFFER_PREFIX,
+        dtype,
+        shape_str,
+        base64::encode(data.as_bytes())
+    )))
+}
+
+// Read back a buffer as a numpy array sharing the decoded bytes, or as bytes without numpy.
+fn buffer_to_py<'p>(py: Python<'p>, encoded: &str) -> PyResult<&'p PyAny> {
+    let invalid = || PyValueError::new_err("invalid buffer");
+    let mut parts = encoded.splitn(3, ':');
+    let dtype = parts.next().ok_or_else(invalid)?;
+    let shape = parts
+        .next()
+        .ok_or_else(invalid)?
+        .split(',')
+        .filter(|d| !d.is_empty())
+        .map(|d| d.parse().map_err(|_| invalid()))
+        .collect::<PyResult<std::vec::Vec<usize>>>()?;
+    let data = base64::decode(parts.next().ok_or_else(invalid)?)
+        .map_err(|e| PyValueError::new_err(e.to_string()))?;
+    let bytes = PyBytes::new(py, &data);
+    match py.import("numpy") {
+        Ok(numpy) => {
+            let array = numpy.call_method1("frombuffer", (bytes, dtype))?;
+            array.call_method1("reshape", (PyTuple::new(py, &shape),))
+        }
+        Err(_) => Ok(bytes),
+    }
+}
+
 // Convert from an automerge_value to something Python compatible
 fn automerge_to_py_val<'p>(py: Python<'p>, am_value: &automerge_frontend::Value) -> &'p PyAny {
     let result: &PyAny = match am_value {
@@ -254,7 +324,7 @@ fn automerge_to_py_val<'p>(py: Python<'p>, am_value: &automerge_frontend::Value)
 
 // fn py_int_to_bytearray<'p>(py: Python<'p>, val: int) -> &'p PyByteArray {}
 
-fn py_to_automerge_val(py_value: &PyAny) -> automerge_frontend::Value {
+fn py_to_automerge_val(py_value: &PyAny) -> PyResult<automerge_frontend::Value> {
     let gil = Python::acquire_gil();
     let py = gil.python();
     let scalar_null = automerge_protocol::ScalarValue::Null;
@@ -300,11 +370,16 @@ fn py_to_automerge_val(py_value: &PyAny) -> automerge_frontend::Value {
 
         // Now, we can build a frontend value from this scalar value
         converted_value = automerge_frontend::Value::Primitive(scalar_value);
-    } else if PyByteArray::type_object(py).is_instance(py_value).unwrap() {
-        // TODO :  Build the frontend value
-        let byte_array_value = py_value.downcast::<PyByteArray>().unwrap();
-        println!(" RUST TODO HANDLE BYTE ARRAY {:?}", py_value);
-        println!(" RUST UNICODE VALUE {:?}", byte_array_value);
+    } else if unsafe { ffi::PyObject_CheckBuffer(py_value.as_ptr()) } != 0 {
+        // numpy scalars also expose a buffer, store them as python scalars
+        if py_value.hasattr("item").unwrap()
+            && py_value.getattr("ndim").and_then(|n| n.extract::<usize>()).unwrap_or(1) == 0
+        {
+            converted_value = py_to_automerge_val(py_value.call_method0("item")?)?;
+        } else {
+            converted_value =
+                automerge_frontend::Value::Primitive(py_buffer_to_scalar(py, py_value)?);
+        }
     } else if PyUnicode::type_object(py).is_instance(py_value).unwrap() {
         let unicode_value = py_value.downcast::<PyUnicode>().unwrap();
 
@@ -321,7 +396,7 @@ fn py_to_automerge_val(py_value: &PyAny) -> automerge_frontend::Value {
 
         let mut converted_list: std::vec::Vec<automerge_frontend::Value> = std::vec::Vec::new();
         for item in list_value.iter() {
-            converted_list.push(py_to_automerge_val(item));
+            converted_list.push(py_to_automerge_val(item)?);
         }
 
         converted_value = automerge_frontend::Value::Sequence(converted_list);
@@ -334,9 +409,8 @@ fn py_to_automerge_val(py_value: &PyAny) -> automerge_frontend::Value {
         let mut hashmap_converted: HashMap<String, automerge_frontend::Value> = HashMap::new();
 
         for key in dict_value.keys() {
-            hashmap_converted
-                .entry(key.to_string())
-                .or_insert(py_to_automerge_val(dict_value.get_item(key).unwrap()));
+            let value = py_to_automerge_val(dict_value.get_item(key).unwrap())?;
+            hashmap_converted.entry(key.to_string()).or_insert(value);
         }
 
         converted_value =
@@ -348,11 +422,11 @@ fn py_to_automerge_val(py_value: &PyAny) -> automerge_frontend::Value {
         // TODO : handle this better
         println!(" RUST COULDNT CAST {:?}", py_value);
     }
-    return converted_value;
+    Ok(converted_value)
 }
 
 //  This function is out of the #[pymethods] declaration because we don't want to expose it to Python
-fn base_document(hashmap_struct: HashMap<String, &PyAny>) -> automerge_backend::Backend {
+fn base_document(hashmap_struct: HashMap<String, &PyAny>) -> PyResult<automerge_backend::Backend> {
     let mut backend = automerge_backend::Backend::init();
     let mut frontend = automerge_frontend::Frontend::new();
 
@@ -360,7 +434,7 @@ fn base_document(hashmap_struct: HashMap<String, &PyAny>) -> automerge_backend::
     let mut hashmap_converted: HashMap<String, automerge_frontend::Value> = HashMap::new();
     for key in hashmap_struct.keys() {
         let py_value = hashmap_struct[key];
-        let converted_value = py_to_automerge_val(py_value);
+        let converted_value = py_to_automerge_val(py_value)?;
         hashmap_converted
             .entry(key.to_string())
             .or_insert(converted_value);
@@ -390,7 +464,7 @@ fn base_document(hashmap_struct: HashMap<String, &PyAny>) -> automerge_backend::
             .unwrap()
             .0;
     }
-    return backend;
+    Ok(backend)
 }
 
 pub fn init_submodule(module: &PyModule) -> PyResult<()> {
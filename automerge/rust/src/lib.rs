@@ -1,5 +1,6 @@
 use pyo3::prelude::*;
-use std::fs::File;
+use pyo3::wrap_pyfunction;
+use std::fs::OpenOptions;
 // Logging
 use log::LevelFilter;
 use simplelog::*;
@@ -7,18 +8,27 @@ mod automerge_map;
 mod nbformatbackend;
 mod textarea;
 
+// Installs the global logger. Called by the python package on the first use of
+// the module rather than at import, and appends to the log instead of truncating it.
+#[pyfunction]
+fn init_logging(log_path: &str) -> PyResult<()> {
+    let file = OpenOptions::new()
+        .create(true)
+        .append(true)
+        .open(log_path)
+        .map_err(|e| pyo3::exceptions::PyIOError::new_err(e.to_string()))?;
+    // A logger can only be installed once per process, keep the first one.
+    let _ = CombinedLogger::init(vec![
+        TermLogger::new(LevelFilter::Warn, Config::default(), TerminalMode::Mixed),
+        WriteLogger::new(LevelFilter::Info, Config::default(), file),
+    ]);
+    Ok(())
+}
+
 // The main python module - jupyter_rtc_automerge
 #[pymodule]
 fn jupyter_rtc_automerge(py: Python, module: &PyModule) -> PyResult<()> {
-    CombinedLogger::init(vec![
-        TermLogger::new(LevelFilter::Warn, Config::default(), TerminalMode::Mixed),
-        WriteLogger::new(
-            LevelFilter::Info,
-            Config::default(),
-            File::create("/tmp/jupyter_rtc_automerge.log").unwrap(),
-        ),
-    ])
-    .unwrap();
+    module.add_function(wrap_pyfunction!(init_logging, module)?)?;
 
     let submod_textarea = PyModule::new(py, "textarea")?;
     textarea::init_submodule(submod_textarea)?;
@@ -1,10 +1,17 @@
 use automerge_backend;
+use automerge_frontend;
+use automerge_protocol;
 use log::info;
+use memmap2::Mmap;
 use pyo3::conversion::FromPyObject;
+use pyo3::exceptions::{PyIOError, PyValueError};
 use pyo3::prelude::*;
-use pyo3::types::PyDict;
+use pyo3::types::{PyBytes, PyDict};
 use pyo3::wrap_pyfunction;
+use serde::de::{self, Deserialize, DeserializeSeed, Deserializer, MapAccess, SeqAccess, Visitor};
 use std::collections::HashMap;
+use std::convert::TryFrom;
+use std::fs::File;
 use std::vec;
 
 /// This enum is important as it gives us all
@@ -114,10 +121,390 @@ fn initialize_nbdoc(pynb: PyObject, py: Python) -> Vec<u8> {
     return backend_data.unwrap();
 }
 
+/// A json value of the notebook, deserialized straight into an automerge value.
+struct NbValue(automerge_frontend::Value);
+
+/// A cell of the notebook. Its source is collaborative text, whether it is
+/// stored as one string or as a list of lines.
+struct NbCell(automerge_frontend::Value);
+
+#[derive(serde::Deserialize)]
+#[serde(untagged)]
+enum NbSource {
+    Text(String),
+    Lines(Vec<String>),
+}
+
+fn nb_scalar(value: automerge_protocol::ScalarValue) -> NbValue {
+    NbValue(automerge_frontend::Value::Primitive(value))
+}
+
+struct NbValueVisitor;
+
+impl<'de> Visitor<'de> for NbValueVisitor {
+    type Value = NbValue;
+
+    fn expecting(&self, formatter: &mut std::fmt::Formatter) -> std::fmt::Result {
+        formatter.write_str("a notebook json value")
+    }
+
+    fn visit_bool<E>(self, value: bool) -> Result<NbValue, E> {
+        Ok(nb_scalar(automerge_protocol::ScalarValue::Boolean(value)))
+    }
+
+    fn visit_i64<E>(self, value: i64) -> Result<NbValue, E> {
+        Ok(nb_scalar(automerge_protocol::ScalarValue::Int(value)))
+    }
+
+    fn visit_u64<E>(self, value: u64) -> Result<NbValue, E> {
+        // Only the integers above i64::MAX are kept unsigned.
+        Ok(nb_scalar(match i64::try_from(value) {
+            Ok(value) => automerge_protocol::ScalarValue::Int(value),
+            Err(_) => automerge_protocol::ScalarValue::Uint(value),
+        }))
+    }
+
+    fn visit_f64<E>(self, value: f64) -> Result<NbValue, E> {
+        Ok(nb_scalar(automerge_protocol::ScalarValue::F64(value)))
+    }
+
+    fn visit_str<E>(self, value: &str) -> Result<NbValue, E> {
+        Ok(nb_scalar(automerge_protocol::ScalarValue::Str(value.to_string())))
+    }
+
+    fn visit_string<E>(self, value: String) -> Result<NbValue, E> {
+        Ok(nb_scalar(automerge_protocol::ScalarValue::Str(value)))
+    }
+
+    fn visit_unit<E>(self) -> Result<NbValue, E> {
+        Ok(nb_scalar(automerge_protocol::ScalarValue::Null))
+    }
+
+    fn visit_seq<A: SeqAccess<'de>>(self, mut seq: A) -> Result<NbValue, A::Error> {
+        let mut values = Vec::with_capacity(seq.size_hint().unwrap_or(0));
+        while let Some(NbValue(value)) = seq.next_element()? {
+            values.push(value);
+        }
+        Ok(NbValue(automerge_frontend::Value::Sequence(values)))
+    }
+
+    fn visit_map<A: MapAccess<'de>>(self, mut map: A) -> Result<NbValue, A::Error> {
+        let mut values = HashMap::with_capacity(map.size_hint().unwrap_or(0));
+        while let Some(key) = map.next_key::<String>()? {
+            values.insert(key, map.next_value::<NbValue>()?.0);
+        }
+        Ok(NbValue(automerge_frontend::Value::Map(
+            values,
+            automerge_protocol::MapType::Map,
+        )))
+    }
+}
+
+impl<'de> Deserialize<'de> for NbValue {
+    fn deserialize<D: Deserializer<'de>>(deserializer: D) -> Result<Self, D::Error> {
+        deserializer.deserialize_any(NbValueVisitor)
+    }
+}
+
+struct NbCellVisitor;
+
+impl<'de> Visitor<'de> for NbCellVisitor {
+    type Value = NbCell;
+
+    fn expecting(&self, formatter: &mut std::fmt::Formatter) -> std::fmt::Result {
+        formatter.write_str("a notebook cell")
+    }
+
+    fn visit_map<A: MapAccess<'de>>(self, mut map: A) -> Result<NbCell, A::Error> {
+        let mut values = HashMap::with_capacity(map.size_hint().unwrap_or(0));
+        while let Some(key) = map.next_key::<String>()? {
+            // Only the source of the cell itself is text, a `source` key
+            // nested in its metadata or outputs is left as it is.
+            let value = if key == "source" {
+                let text = match map.next_value::<NbSource>()? {
+                    NbSource::Text(text) => text,
+                    NbSource::Lines(lines) => lines.concat(),
+                };
+                automerge_frontend::Value::Text(text.chars().collect())
+            } else {
+                map.next_value::<NbValue>()?.0
+            };
+            values.insert(key, value);
+        }
+        Ok(NbCell(automerge_frontend::Value::Map(
+            values,
+            automerge_protocol::MapType::Map,
+        )))
+    }
+}
+
+impl<'de> Deserialize<'de> for NbCell {
+    fn deserialize<D: Deserializer<'de>>(deserializer: D) -> Result<Self, D::Error> {
+        deserializer.deserialize_map(NbCellVisitor)
+    }
+}
+
+/// Number of cells added to the document by each change while a notebook
+/// is loaded. One change per cell would give a notebook of 10k cells a
+/// history of 10k changes to store, send and replay; larger batches hold
+/// more parsed cells in memory at once.
+const CELLS_PER_CHANGE: usize = 64;
+
+/// The automerge document a notebook is loaded into, one change at a time.
+///
+/// The frontend builds the changes: it holds a materialized copy of the
+/// document, next to the operations held by the backend.
+struct NbDocument {
+    backend: automerge_backend::Backend,
+    frontend: automerge_frontend::Frontend,
+}
+
+impl NbDocument {
+    fn apply(
+        &mut self,
+        message: &str,
+        changes: Vec<automerge_frontend::LocalChange>,
+    ) -> Result<(), String> {
+        let change_request = self
+            .frontend
+            .change::<_, automerge_frontend::InvalidChangeRequest>(
+                Some(message.into()),
+                |frontend| {
+                    for change in changes {
+                        frontend.add_change(change)?;
+                    }
+                    Ok(())
+                },
+            )
+            .map_err(|e| format!("{:?}", e))?;
+        if let Some(change_request) = change_request {
+            let patch = self
+                .backend
+                .apply_local_change(change_request)
+                .map_err(|e| format!("{:?}", e))?
+                .0;
+            self.frontend
+                .apply_patch(patch)
+                .map_err(|e| format!("{:?}", e))?;
+        }
+        Ok(())
+    }
+}
+
+/// Adds the keys of the notebook to the document as they are parsed.
+struct NotebookSeed<'a>(&'a mut NbDocument);
+
+impl<'de, 'a> DeserializeSeed<'de> for NotebookSeed<'a> {
+    type Value = ();
+
+    fn deserialize<D: Deserializer<'de>>(self, deserializer: D) -> Result<(), D::Error> {
+        deserializer.deserialize_map(self)
+    }
+}
+
+impl<'de, 'a> Visitor<'de> for NotebookSeed<'a> {
+    type Value = ();
+
+    fn expecting(&self, formatter: &mut std::fmt::Formatter) -> std::fmt::Result {
+        formatter.write_str("a notebook object")
+    }
+
+    fn visit_map<A: MapAccess<'de>>(self, mut map: A) -> Result<(), A::Error> {
+        let document = self.0;
+        while let Some(key) = map.next_key::<String>()? {
+            let path = automerge_frontend::Path::root().key(key.as_str());
+            if key == "cells" {
+                let cells = automerge_frontend::Value::Sequence(Vec::new());
+                document
+                    .apply(
+                        "load notebook",
+                        vec![automerge_frontend::LocalChange::set(path, cells)],
+                    )
+                    .map_err(de::Error::custom)?;
+                map.next_value_seed(CellsSeed(&mut *document))?;
+            } else {
+                let NbValue(value) = map.next_value()?;
+                document
+                    .apply(
+                        "load notebook",
+                        vec![automerge_frontend::LocalChange::set(path, value)],
+                    )
+                    .map_err(de::Error::custom)?;
+            }
+        }
+        Ok(())
+    }
+}
+
+/// Inserts the cells in the document as they are parsed, `CELLS_PER_CHANGE`
+/// cells per change.
+struct CellsSeed<'a>(&'a mut NbDocument);
+
+impl<'de, 'a> DeserializeSeed<'de> for CellsSeed<'a> {
+    type Value = ();
+
+    fn deserialize<D: Deserializer<'de>>(self, deserializer: D) -> Result<(), D::Error> {
+        deserializer.deserialize_seq(self)
+    }
+}
+
+impl<'de, 'a> Visitor<'de> for CellsSeed<'a> {
+    type Value = ();
+
+    fn expecting(&self, formatter: &mut std::fmt::Formatter) -> std::fmt::Result {
+        formatter.write_str("a list of notebook cells")
+    }
+
+    fn visit_seq<A: SeqAccess<'de>>(self, mut seq: A) -> Result<(), A::Error> {
+        let document = self.0;
+        let mut index: u32 = 0;
+        let mut batch = Vec::with_capacity(CELLS_PER_CHANGE);
+        while let Some(NbCell(cell)) = seq.next_element()? {
+            let path = automerge_frontend::Path::root().key("cells").index(index);
+            batch.push(automerge_frontend::LocalChange::insert(path, cell));
+            index += 1;
+            if batch.len() == CELLS_PER_CHANGE {
+                let cells = std::mem::replace(&mut batch, Vec::with_capacity(CELLS_PER_CHANGE));
+                document
+                    .apply("load cells", cells)
+                    .map_err(de::Error::custom)?;
+            }
+        }
+        if !batch.is_empty() {
+            document
+                .apply("load cells", batch)
+                .map_err(de::Error::custom)?;
+        }
+        Ok(())
+    }
+}
+
+enum LoadError {
+    Io(std::io::Error),
+    Invalid(String),
+}
+
+impl From<LoadError> for PyErr {
+    fn from(error: LoadError) -> PyErr {
+        match error {
+            LoadError::Io(e) => PyIOError::new_err(e.to_string()),
+            LoadError::Invalid(e) => PyValueError::new_err(e),
+        }
+    }
+}
+
+/// Parses the json of a notebook into a new automerge document.
+///
+/// Internal Function
+/// Every top level key, and every batch of `CELLS_PER_CHANGE` cells, is
+/// added by its own change while the json is parsed, so no json tree of
+/// the notebook is built. While parsing, the memory held is the operations
+/// of the backend, the materialized copy of the frontend and one batch of
+/// cells. The frontend is dropped before the backend is saved.
+/// Returns the saved document.
+fn notebook_document(data: &[u8]) -> Result<Vec<u8>, LoadError> {
+    let mut document = NbDocument {
+        backend: automerge_backend::Backend::init(),
+        frontend: automerge_frontend::Frontend::new(),
+    };
+    let mut deserializer = serde_json::Deserializer::from_slice(data);
+    NotebookSeed(&mut document)
+        .deserialize(&mut deserializer)
+        .and_then(|()| deserializer.end())
+        .map_err(|e| LoadError::Invalid(e.to_string()))?;
+    let NbDocument { backend, frontend } = document;
+    drop(frontend);
+    backend
+        .save()
+        .map_err(|e| LoadError::Invalid(format!("{:?}", e)))
+}
+
+fn json_value(value: &automerge_frontend::Value) -> serde_json::Value {
+    match value {
+        automerge_frontend::Value::Map(map, _) => serde_json::Value::Object(
+            map.iter()
+                .map(|(key, value)| (key.clone(), json_value(value)))
+                .collect(),
+        ),
+        automerge_frontend::Value::Sequence(values) => {
+            serde_json::Value::Array(values.iter().map(json_value).collect())
+        }
+        automerge_frontend::Value::Text(chars) => {
+            serde_json::Value::String(chars.iter().collect())
+        }
+        automerge_frontend::Value::Primitive(scalar) => match scalar {
+            automerge_protocol::ScalarValue::Str(s) => serde_json::json!(s),
+            automerge_protocol::ScalarValue::Int(i) => serde_json::json!(i),
+            automerge_protocol::ScalarValue::Uint(ui) => serde_json::json!(ui),
+            automerge_protocol::ScalarValue::F64(f) => serde_json::json!(f),
+            automerge_protocol::ScalarValue::F32(f) => serde_json::json!(f),
+            automerge_protocol::ScalarValue::Counter(c) => serde_json::json!(c),
+            automerge_protocol::ScalarValue::Timestamp(t) => serde_json::json!(t),
+            automerge_protocol::ScalarValue::Boolean(b) => serde_json::json!(b),
+            automerge_protocol::ScalarValue::Null => serde_json::Value::Null,
+        },
+    }
+}
+
+/// Returns the json of the notebook held by a document, with its cell
+/// sources as strings.
+///
+/// Python Method
+/// Returns a json string to Python
+#[pyfunction]
+fn get_notebook(doc: Vec<u8>) -> PyResult<String> {
+    let backend = automerge_backend::Backend::load(doc)
+        .map_err(|e| PyValueError::new_err(format!("{:?}", e)))?;
+    let mut frontend = automerge_frontend::Frontend::new();
+    let patch = backend
+        .get_patch()
+        .map_err(|e| PyValueError::new_err(format!("{:?}", e)))?;
+    frontend
+        .apply_patch(patch)
+        .map_err(|e| PyValueError::new_err(format!("{:?}", e)))?;
+    let notebook = frontend
+        .get_value(&automerge_frontend::Path::root())
+        .map(|value| json_value(&value))
+        .unwrap_or(serde_json::Value::Null);
+    Ok(notebook.to_string())
+}
+
+/// Loads a notebook straight into a new automerge document, from the
+/// path of a .ipynb file or from its bytes. Cell sources become text.
+///
+/// The file is memory-mapped and parsed with the GIL released, without
+/// building python objects. The cells are added to the document in
+/// batches as they are parsed, see `notebook_document` for the memory
+/// held meanwhile. The saved document is then copied into the returned
+/// bytes, so at the end it is held twice.
+///
+/// Python Method
+/// Returns the saved document as bytes
+#[pyfunction]
+fn load_notebook(source: &PyAny, py: Python) -> PyResult<PyObject> {
+    let document = if let Ok(bytes) = source.downcast::<PyBytes>() {
+        let data = bytes.as_bytes();
+        py.allow_threads(|| notebook_document(data))?
+    } else {
+        let path: String = py
+            .import("os")?
+            .call_method1("fspath", (source,))?
+            .extract()?;
+        py.allow_threads(move || {
+            let file = File::open(&path).map_err(LoadError::Io)?;
+            let data = unsafe { Mmap::map(&file) }.map_err(LoadError::Io)?;
+            notebook_document(&data)
+        })?
+    };
+    Ok(PyBytes::new(py, &document).into())
+}
+
 pub fn init_submodule(module: &PyModule) -> PyResult<()> {
     module.add_function(wrap_pyfunction!(serialize_notebook, module)?)?;
     module.add_function(wrap_pyfunction!(initialize_nbdoc, module)?)?;
     module.add_function(wrap_pyfunction!(get_changes, module)?)?;
     module.add_function(wrap_pyfunction!(apply_change, module)?)?;
+    module.add_function(wrap_pyfunction!(load_notebook, module)?)?;
+    module.add_function(wrap_pyfunction!(get_notebook, module)?)?;
     Ok(())
 }
@@ -50,15 +50,59 @@ fn new_document(doc_id: &str, text: &str) -> std::vec::Vec<u8> {
 }
 
 // TODO : Rename this into "apply_change", as it applies only *one* change
+// Also returns whether the change was applied: a change whose dependencies
+// are missing is queued by automerge, and dropped when the document is saved.
 #[pyfunction]
-fn apply_changes(doc: std::vec::Vec<u8>, changes_bytes: std::vec::Vec<u8>) -> std::vec::Vec<u8> {
+fn apply_changes(
+    doc: std::vec::Vec<u8>,
+    changes_bytes: std::vec::Vec<u8>,
+) -> (std::vec::Vec<u8>, bool) {
+    let (data, _patch, applied) = apply_change(doc, changes_bytes);
+    return (data, applied);
+}
+
+// Same as apply_changes, also returning the automerge patch of the change as json,
+// for the server side observers of a room.
+#[pyfunction]
+fn apply_changes_with_patch(
+    doc: std::vec::Vec<u8>,
+    changes_bytes: std::vec::Vec<u8>,
+) -> (std::vec::Vec<u8>, String, bool) {
+    let (data, patch, applied) = apply_change(doc, changes_bytes);
+    return (data, serde_json::to_string(&patch).unwrap(), applied);
+}
+
+fn apply_change(
+    doc: std::vec::Vec<u8>,
+    changes_bytes: std::vec::Vec<u8>,
+) -> (std::vec::Vec<u8>, automerge_protocol::Patch, bool) {
     let mut doc = automerge_backend::Backend::load(doc)
         .and_then(|back| Ok(back))
         .unwrap();
     let changes = automerge_backend::Change::from_bytes(changes_bytes)
         .and_then(|c| Ok(c))
         .unwrap();
-    doc.apply_changes(vec![changes])
+    let count = doc.get_changes(&[]).len();
+    let patch = doc.apply_changes(vec![changes]).unwrap();
+    let applied = doc.get_changes(&[]).len() > count;
+    let data = doc.save().and_then(|data| Ok(data));
+    return (data.unwrap(), patch, applied);
+}
+
+// Applies a list of changes at once, e.g. to replay history from a checkpoint.
+#[pyfunction]
+fn apply_many_changes(
+    doc: std::vec::Vec<u8>,
+    changes_bytes: std::vec::Vec<std::vec::Vec<u8>>,
+) -> std::vec::Vec<u8> {
+    let mut doc = automerge_backend::Backend::load(doc)
+        .and_then(|back| Ok(back))
+        .unwrap();
+    let mut changes: std::vec::Vec<automerge_backend::Change> = std::vec::Vec::new();
+    for bytes in changes_bytes.into_iter() {
+        changes.push(automerge_backend::Change::from_bytes(bytes).unwrap());
+    }
+    doc.apply_changes(changes)
         .and_then(|patch| Ok(patch))
         .unwrap();
     let data = doc.save().and_then(|data| Ok(data));
@@ -78,10 +122,79 @@ fn get_all_changes(doc: std::vec::Vec<u8>) -> std::vec::Vec<std::vec::Vec<u8>> {
     return bytes;
 }
 
+// Materializes the document and returns the current content of its textArea.
+// Used to fold a long history into a fresh baseline document.
+#[pyfunction]
+fn get_text(doc: std::vec::Vec<u8>) -> String {
+    let backend = automerge_backend::Backend::load(doc)
+        .and_then(|back| Ok(back))
+        .unwrap();
+    let mut frontend = automerge_frontend::Frontend::new();
+    frontend.apply_patch(backend.get_patch().unwrap());
+    let path = automerge_frontend::Path::root().key("textArea");
+    match frontend.get_value(&path) {
+        Some(automerge_frontend::Value::Text(chars)) => chars.iter().collect(),
+        _ => String::new(),
+    }
+}
+
+// Applies text edits as a single change and returns the new document with that change
+// and its automerge patch as json.
+// Each edit is (index, remove, insert), with indices in the current text and edits in
+// increasing order: they are applied from the last one so earlier indices stay valid.
+#[pyfunction]
+fn splice_text(
+    doc: std::vec::Vec<u8>,
+    edits: std::vec::Vec<(usize, usize, String)>,
+) -> (std::vec::Vec<u8>, std::vec::Vec<u8>, String) {
+    let mut backend = automerge_backend::Backend::load(doc)
+        .and_then(|back| Ok(back))
+        .unwrap();
+    let mut frontend = automerge_frontend::Frontend::new();
+    frontend.apply_patch(backend.get_patch().unwrap());
+    let text_path = automerge_frontend::Path::root().key("textArea");
+    let change_request = frontend
+        .change::<_, automerge_frontend::InvalidChangeRequest>(
+            Some("reconcile".into()),
+            |frontend| {
+                for (index, remove, insert) in edits.iter().rev() {
+                    for _ in 0..*remove {
+                        frontend.add_change(automerge_frontend::LocalChange::delete(
+                            text_path.clone().index(*index as u32),
+                        ))?;
+                    }
+                    for (offset, c) in insert.chars().enumerate() {
+                        frontend.add_change(automerge_frontend::LocalChange::insert(
+                            text_path.clone().index((*index + offset) as u32),
+                            automerge_frontend::Value::Primitive(
+                                automerge_protocol::ScalarValue::Str(c.to_string()),
+                            ),
+                        ))?;
+                    }
+                }
+                Ok(())
+            },
+        )
+        .unwrap();
+    let (patch, change) = backend
+        .apply_local_change(change_request.unwrap())
+        .unwrap();
+    let data = backend.save().and_then(|data| Ok(data));
+    return (
+        data.unwrap(),
+        change.bytes.clone(),
+        serde_json::to_string(&patch).unwrap(),
+    );
+}
+
 pub fn init_submodule(module: &PyModule) -> PyResult<()> {
     module.add_function(wrap_pyfunction!(new_document, module)?)?;
     module.add_function(wrap_pyfunction!(apply_changes, module)?)?;
+    module.add_function(wrap_pyfunction!(apply_many_changes, module)?)?;
+    module.add_function(wrap_pyfunction!(apply_changes_with_patch, module)?)?;
     module.add_function(wrap_pyfunction!(get_all_changes, module)?)?;
+    module.add_function(wrap_pyfunction!(get_text, module)?)?;
+    module.add_function(wrap_pyfunction!(splice_text, module)?)?;
     Ok(())
 }
 
@@ -97,3 +210,17 @@ fn test_new_document() {
     // There must be two changes : one to set the doc id, one to set the content.
     assert_eq!( changes.len(), 2  );
 }
+
+#[test]
+fn test_get_text() {
+    let doc = new_document("test_doc_id", "Test content");
+    assert_eq!(get_text(doc), "Test content");
+}
+
+#[test]
+fn test_splice_text() {
+    let doc = new_document("test_doc_id", "Hello world");
+    let (doc, _change, _patch) = splice_text(doc, vec![(0, 1, "J".to_string()), (6, 5, "there".to_string())]);
+    assert_eq!(get_text(doc.clone()), "Jello there");
+    assert_eq!(get_all_changes(doc).len(), 3);
+}
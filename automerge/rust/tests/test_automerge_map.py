@@ -1,6 +1,11 @@
 from jupyter_rtc_automerge import automerge_map as am
 
-from unittest import TestCase
+from unittest import TestCase, skipIf
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 
 class TestAutomergeMap(TestCase):
@@ -176,3 +181,41 @@ class TestAutomergeMap(TestCase):
         self.assertEqual(doc2.to_dict(), expected_result, "Applying changes from one doc to another failed")
 
 
+    @skipIf(np is None, "numpy is not installed")
+    def test_numpy_array(self):
+
+        array = np.arange(100000, dtype=np.float64).reshape(1000, 100)
+
+        doc = am.AutomergeMap({"key0": "value0"})
+        doc["array"] = array
+
+        result = doc["array"]
+        self.assertIsInstance(result, np.ndarray)
+        self.assertEqual(result.dtype, array.dtype)
+        self.assertEqual(result.shape, array.shape)
+        self.assertTrue(np.array_equal(result, array), "Storing a numpy array and retrieving it failed")
+        # The array is stored as one atomic value : one change for the creation, one for the set
+        self.assertEqual( len(doc.get_all_changes()), 2 )
+
+
+    def test_bytes(self):
+
+        doc = am.AutomergeMap({"key0": b"\x00\x01\x02"})
+        result = doc["key0"]
+        self.assertEqual(bytes(result), b"\x00\x01\x02", "Storing bytes and retrieving them failed")
+
+
+    @skipIf(np is None, "numpy is not installed")
+    def test_numpy_object_array(self):
+
+        doc = am.AutomergeMap({"key0": "value0"})
+        with self.assertRaises(TypeError):
+            doc["array"] = np.array([{"a": 1}, None], dtype=object)
+        self.assertEqual( len(doc.get_all_changes()), 1 )
+
+
+    def test_string_like_a_buffer(self):
+
+        value = "\x00automerge_buffer\x00<f8:2:AAAA"
+        doc = am.AutomergeMap({"key0": value})
+        self.assertEqual(doc["key0"], value, "A string was read as a buffer")
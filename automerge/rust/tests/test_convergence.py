@@ -0,0 +1,188 @@
+"""Convergence of concurrent replicas and merge throughput of the bindings.
+
+M replicas of an AutomergeMap or a textarea document make random concurrent
+edits and exchange their changes in random orders and batch sizes. Once all
+the changes have been exchanged, every replica must hold the same state.
+
+As a regression test :
+    python -m pytest rust/tests/test_convergence.py
+As a performance profile :
+    python rust/tests/test_convergence.py --replicas 8 --rounds 200
+"""
+import argparse
+import hashlib
+import logging
+import random
+import resource
+import string
+import time
+
+from hypothesis import given, settings, strategies as st
+from jupyter_rtc_automerge import automerge_map as am
+from jupyter_rtc_automerge import textarea
+
+logger = logging.getLogger(__name__)
+
+
+def change_id(change):
+    return hashlib.sha256(bytes(change)).digest()
+
+
+class MapReplica:
+
+    def __init__(self, doc):
+        self.doc = doc
+
+    @classmethod
+    def create(cls, count):
+        base = am.AutomergeMap({"key0": "value0"})
+        return [cls(base.copy()) for _ in range(count)]
+
+    def edit(self, rng):
+        key = f"key{rng.randint(0, 4)}"
+        value = rng.choice([
+            rng.randint(-1000, 1000),
+            "".join(rng.choices(string.ascii_letters, k=rng.randint(0, 10))),
+            [rng.randint(0, 9) for _ in range(rng.randint(0, 5))],
+        ])
+        self.doc[key] = value
+
+    def changes(self):
+        return self.doc.get_all_changes()
+
+    def apply(self, changes):
+        self.doc.apply_changes(changes)
+
+    def state(self):
+        return self.doc.to_dict()
+
+
+class TextReplica:
+
+    def __init__(self, doc):
+        self.doc = doc
+
+    @classmethod
+    def create(cls, count):
+        base = textarea.new_document("convergence", "Hello replicas")
+        return [cls(base) for _ in range(count)]
+
+    def edit(self, rng):
+        length = len(textarea.get_text(self.doc))
+        index = rng.randint(0, length)
+        remove = rng.randint(0, min(3, length - index))
+        insert = "".join(rng.choices(string.ascii_letters + " \n", k=rng.randint(0, 5)))
+        if remove or insert:
+            self.doc, _change, _patch = textarea.splice_text(self.doc, [(index, remove, insert)])
+
+    def changes(self):
+        return textarea.get_all_changes(self.doc)
+
+    def apply(self, changes):
+        self.doc = textarea.apply_many_changes(self.doc, changes)
+
+    def state(self):
+        return textarea.get_text(self.doc)
+
+
+class Stats:
+
+    def __init__(self):
+        self.merged_changes = 0
+        self.merge_seconds = 0.0
+        self.history = []
+
+    def record(self, replicas):
+        history_bytes = sum(len(c) for c in replicas[0].changes())
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        self.history.append((len(replicas[0].changes()), history_bytes, max_rss))
+
+    def report(self):
+        throughput = self.merged_changes / self.merge_seconds if self.merge_seconds else 0
+        lines = [f"merged {self.merged_changes} changes in {self.merge_seconds:.3f}s "
+                 f"({throughput:.0f} changes/s)"]
+        for changes, history_bytes, max_rss in self.history:
+            lines.append(f"  {changes} changes, {history_bytes} history bytes, max rss {max_rss} kB")
+        return "\n".join(lines)
+
+
+def send(sender, receiver, rng, stats, max_batch=None):
+    """Send changes of `sender` that `receiver` has not applied, shuffled.
+    Sends a random batch of them, or all of them when `max_batch` is None.
+
+    Changes whose dependencies are missing are not kept when the document is
+    saved, so they are sent again until they can be applied."""
+    applied = {change_id(c) for c in receiver.changes()}
+    missing = [c for c in sender.changes() if change_id(c) not in applied]
+    if not missing:
+        return 0
+    rng.shuffle(missing)
+    if max_batch is not None:
+        missing = missing[:rng.randint(1, max_batch)]
+    start = time.perf_counter()
+    receiver.apply(missing)
+    stats.merge_seconds += time.perf_counter() - start
+    stats.merged_changes += len(missing)
+    return len(missing)
+
+
+def run(replica_class, replicas=3, rounds=20, max_batch=5, seed=0, record_every=0):
+    """Run the random edits and exchanges, assert convergence and return the stats."""
+    rng = random.Random(seed)
+    stats = Stats()
+    group = replica_class.create(replicas)
+    for step in range(rounds):
+        for replica in group:
+            for _ in range(rng.randint(0, 2)):
+                replica.edit(rng)
+        for _ in range(rng.randint(0, replicas)):
+            sender, receiver = rng.sample(group, 2)
+            send(sender, receiver, rng, stats, max_batch)
+        if record_every and step % record_every == 0:
+            stats.record(group)
+
+    # Exchange everything until no replica is missing a change.
+    while sum(send(s, r, rng, stats) for s in group for r in group if s is not r):
+        pass
+
+    states = [replica.state() for replica in group]
+    for state in states[1:]:
+        assert state == states[0], f"replicas diverged with seed {seed}"
+    stats.record(group)
+    return stats
+
+
+def test_map_convergence():
+    stats = run(MapReplica, replicas=3, rounds=20)
+    logger.info(stats.report())
+
+
+def test_text_convergence():
+    stats = run(TextReplica, replicas=3, rounds=20)
+    logger.info(stats.report())
+
+
+@settings(max_examples=10, deadline=None)
+@given(st.integers(min_value=0, max_value=2**32), st.integers(min_value=2, max_value=5))
+def test_map_convergence_random(seed, replicas):
+    run(MapReplica, replicas=replicas, rounds=10, seed=seed)
+
+
+@settings(max_examples=10, deadline=None)
+@given(st.integers(min_value=0, max_value=2**32), st.integers(min_value=2, max_value=5))
+def test_text_convergence_random(seed, replicas):
+    run(TextReplica, replicas=replicas, rounds=10, seed=seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge throughput and memory profile of the bindings.")
+    parser.add_argument("--kind", choices=["map", "text"], default="text")
+    parser.add_argument("--replicas", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--max-batch", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--record-every", type=int, default=20)
+    args = parser.parse_args()
+    replica_class = MapReplica if args.kind == "map" else TextReplica
+    stats = run(replica_class, args.replicas, args.rounds, args.max_batch, args.seed, args.record_every)
+    print(stats.report())
@@ -1,3 +1,5 @@
+import json
+
 import pytest
 import jupyter_rtc_automerge 
 import nbformat
@@ -6,3 +8,65 @@ def test_backend():
     test_nb = nbformat.v4.new_notebook()
     f = jupyter_rtc_automerge.nb.serialize_notebook(test_nb)
     return
+
+
+def test_load_notebook(tmp_path):
+    test_nb = nbformat.v4.new_notebook()
+    test_nb.cells.append(nbformat.v4.new_code_cell("print('hello')"))
+    data = nbformat.writes(test_nb).encode()
+
+    from_bytes = jupyter_rtc_automerge.nb.load_notebook(data)
+    assert isinstance(from_bytes, bytes) and len(from_bytes) > 0
+
+    path = tmp_path / "test.ipynb"
+    path.write_bytes(data)
+    from_path = jupyter_rtc_automerge.nb.load_notebook(str(path))
+    assert len(from_path) > 0
+
+    with pytest.raises(ValueError):
+        jupyter_rtc_automerge.nb.load_notebook(b"not a notebook")
+
+
+def test_load_notebook_sources():
+    notebook = {
+        "nbformat": 4,
+        "nbformat_minor": 5,
+        "metadata": {"source": {"origin": "kept as is"}},
+        "cells": [
+            {
+                "cell_type": "code",
+                "id": "text",
+                "metadata": {"source": {"url": "kept as is"}},
+                "source": "a = 1\nprint(a)",
+                "outputs": [{"output_type": "display_data", "metadata": {},
+                             "data": {"source": {"nested": True}}}],
+                "execution_count": 2 ** 63,
+            },
+            {
+                "cell_type": "markdown",
+                "id": "lines",
+                "metadata": {},
+                "source": ["# Title\n", "body"],
+            },
+        ],
+    }
+    doc = jupyter_rtc_automerge.nb.load_notebook(json.dumps(notebook).encode())
+    loaded = json.loads(jupyter_rtc_automerge.nb.get_notebook(doc))
+
+    text, lines = loaded["cells"]
+    assert text["source"] == "a = 1\nprint(a)"
+    assert lines["source"] == "# Title\nbody"
+    assert text["metadata"] == {"source": {"url": "kept as is"}}
+    assert text["outputs"][0]["data"] == {"source": {"nested": True}}
+    assert text["execution_count"] == 2 ** 63
+    assert loaded["metadata"] == notebook["metadata"]
+
+
+def test_load_notebook_cells_in_batches():
+    # More cells than fit in two changes.
+    test_nb = nbformat.v4.new_notebook()
+    for i in range(130):
+        test_nb.cells.append(nbformat.v4.new_markdown_cell(f"cell {i}"))
+    doc = jupyter_rtc_automerge.nb.load_notebook(nbformat.writes(test_nb).encode())
+    loaded = json.loads(jupyter_rtc_automerge.nb.get_notebook(doc))
+    assert [cell["source"] for cell in loaded["cells"]] == [f"cell {i}" for i in range(130)]
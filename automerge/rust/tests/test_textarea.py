@@ -0,0 +1,36 @@
+import json
+
+from jupyter_rtc_automerge import textarea
+
+
+def test_apply_changes_with_patch():
+    base = textarea.new_document("room", "abc")
+    _doc, change, _patch = textarea.splice_text(base, [(3, 0, "de")])
+
+    doc, patch, applied = textarea.apply_changes_with_patch(base, change)
+    assert applied
+    assert textarea.get_text(doc) == "abcde"
+    doc, applied = textarea.apply_changes(base, change)
+    assert applied and textarea.get_text(doc) == "abcde"
+
+    (text,) = json.loads(patch)["diffs"]["props"]["textArea"].values()
+    assert text["type"] == "text"
+    assert [(edit["action"], edit["index"]) for edit in text["edits"]] == [
+        ("insert", 3),
+        ("insert", 4),
+    ]
+    inserted = [value["value"] for values in text["props"].values() for value in values.values()]
+    assert inserted == ["d", "e"]
+
+
+def test_change_with_missing_dependencies_is_not_applied():
+    base = textarea.new_document("room", "abc")
+    doc, first, _patch = textarea.splice_text(base, [(3, 0, "d")])
+    _doc, second, _patch = textarea.splice_text(doc, [(4, 0, "e")])
+
+    doc, applied = textarea.apply_changes(base, second)
+    assert not applied and textarea.get_text(doc) == "abc"
+    doc, _patch, applied = textarea.apply_changes_with_patch(doc, first)
+    assert applied
+    doc, applied = textarea.apply_changes(doc, second)
+    assert applied and textarea.get_text(doc) == "abcde"
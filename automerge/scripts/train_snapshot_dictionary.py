@@ -0,0 +1,50 @@
+"""Train the snapshot compression dictionary from real room histories.
+
+The samples are the snapshots the rooms would have sent: the changes of each
+checkpoint saved under a `JupyterRTCApp.history_dir`. The trained dictionary
+is written to `output`, to be configured as `JupyterRTCApp.snapshot_dictionary`.
+
+    python scripts/train_snapshot_dictionary.py HISTORY_DIR [...] -o snapshot.dict
+"""
+import argparse
+import glob
+import os
+
+from jupyter_rtc.compression import DEFAULT_DICTIONARY, SnapshotCompressor, train_dictionary
+from jupyter_rtc_automerge import textarea
+
+
+def room_snapshots(history_dir):
+    """Yield the changes of every checkpoint saved under `history_dir`."""
+    for path in sorted(glob.glob(os.path.join(history_dir, '*', '*.automerge'))):
+        with open(path, 'rb') as fid:
+            yield textarea.get_all_changes(fid.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('history_dirs', nargs='+')
+    parser.add_argument('-o', '--output', default='snapshot.dict')
+    parser.add_argument('--size', type=int, default=16 * 1024,
+                        help='Size of the dictionary in bytes.')
+    args = parser.parse_args()
+    snapshots = [changes for directory in args.history_dirs for changes in room_snapshots(directory)]
+    if not snapshots:
+        parser.error(f'No checkpoint found under {args.history_dirs}')
+    dictionary = train_dictionary(snapshots, args.size)
+    with open(args.output, 'wb') as fid:
+        fid.write(dictionary)
+
+    default, trained = SnapshotCompressor(DEFAULT_DICTIONARY), SnapshotCompressor(dictionary)
+    raw = sum(len(change) for changes in snapshots for change in changes)
+    for codec in ('zstd', 'zlib'):
+        sizes = [
+            sum(len(compressor.compress(changes, codec=codec)) for changes in snapshots)
+            for compressor in (default, trained)
+        ]
+        print(f'{codec}: {raw} bytes in {len(snapshots)} snapshots, '
+              f'{sizes[0]} bytes with the default dictionary, {sizes[1]} with {args.output}')
+
+
+if __name__ == '__main__':
+    main()
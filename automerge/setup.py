@@ -12,6 +12,11 @@ setup_args = dict(
     install_requires=[
         'jupyter-rtc-automerge',
     ],
+    extras_require={
+        'zstd': ['zstandard'],
+        'watch': ['watchdog'],
+        'json': ['orjson'],
+    },
     include_package_data=True,
 )
 
@@ -0,0 +1,47 @@
+"""
+Minimal blocking client for the Jupyter server REST API.
+"""
+
+import json
+import os
+import urllib.parse
+import urllib.request
+from typing import *
+
+
+class JupyterClient:
+    def __init__(self, url: Optional[str] = None, token: Optional[str] = None) -> None:
+        self.url = url or os.environ.get("JUPYTER_URL", "http://127.0.0.1:8889/")
+        self.token = token if token is not None else os.environ.get("JUPYTER_TOKEN", "")
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        params: Optional[Dict[str, Any]] = None,
+        body: Optional[Dict[str, Any]] = None,
+    ) -> Any:
+        url = urllib.parse.urljoin(self.url, "api/" + urllib.parse.quote(path.lstrip("/")))
+        if params:
+            query = {k: v for k, v in params.items() if v is not None}
+            url += "?" + urllib.parse.urlencode(query)
+        data = None if body is None else json.dumps(body).encode()
+        request = urllib.request.Request(url, data=data, method=method)
+        request.add_header("Content-Type", "application/json")
+        if self.token:
+            request.add_header("Authorization", f"token {self.token}")
+        with urllib.request.urlopen(request) as response:
+            content = response.read()
+        return json.loads(content) if content else None
+
+    def get(self, path: str, **params: Any) -> Any:
+        return self.request("GET", path, params=params)
+
+    def post(self, path: str, body: Optional[Dict[str, Any]] = None) -> Any:
+        return self.request("POST", path, body=body or {})
+
+    def patch(self, path: str, body: Dict[str, Any]) -> Any:
+        return self.request("PATCH", path, body=body)
+
+    def delete(self, path: str) -> Any:
+        return self.request("DELETE", path)
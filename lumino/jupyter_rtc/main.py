@@ -1,97 +1,267 @@
 """
 Describe API in fast API then translate to openapi b/c writing python
 is nicer than writing YAML!
+
+The endpoints are also served: they update in memory tables of the Jupyter
+server state, whose row diffs are pushed to every client subscribed to the
+`/tables` websocket, instead of each client polling the Jupyter REST API.
+The rows of the `contents` table then follow the files they describe.
+
+    uvicorn jupyter_rtc.main:app
+
+Run this module to print the openapi spec. It is part of the `jupyter_rtc`
+package, so run it as a module:
+
+    python -m jupyter_rtc.main
 """
 
-from fastapi import FastAPI
+import asyncio
+import logging
+import os
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
 from typing import *
 import json
 
+from .jupyter import JupyterClient
+from .tables import Row, Tables
+from .watcher import ContentsWatcher
+
+log = logging.getLogger(__name__)
+
 app = FastAPI()
 
+jupyter = JupyterClient()
+
+# Messages queued for a `/tables` client before it is resynced with a snapshot.
+MAX_PENDING = int(os.environ.get("RTC_MAX_PENDING", "100"))
+
+tables = Tables(
+    ["kernelspecs", "status", "terminals", "kernels", "sessions", "contents"],
+    max_pending=MAX_PENDING,
+)
+
+# Seconds between refreshes of the kernels, sessions and status tables, 0 disables them.
+REFRESH_INTERVAL = float(os.environ.get("RTC_REFRESH_INTERVAL", "0"))
+
+# Root directory of the Jupyter server when it is shared with this server, so
+# the files of the `contents` rows are watched on disk instead of through REST.
+CONTENTS_ROOT = os.environ.get("RTC_CONTENTS_ROOT") or None
+
+# Seconds between checks of the `contents` rows, 0 disables them.
+WATCH_INTERVAL = float(os.environ.get("RTC_WATCH_INTERVAL", "2"))
+
+
+def kernel_row(model: Dict[str, Any]) -> Row:
+    return {
+        "name": model["name"],
+        "last_activity": model.get("last_activity", ""),
+        "connections": model.get("connections", 0),
+        "execution_state": model.get("execution_state", ""),
+    }
+
+
+def session_row(model: Dict[str, Any]) -> Row:
+    return {
+        "path": model["path"],
+        "name": model.get("name", ""),
+        "type": model.get("type", ""),
+        "state": {"label": "created", "kernelID": model["kernel"]["id"]},
+    }
+
+
+def content_row(model: Dict[str, Any]) -> Row:
+    row = {
+        "name": model["name"],
+        "path": model["path"],
+        "type": model["type"],
+        "writeable": model.get("writable", False),
+        "created": model.get("created", ""),
+        "last_modified": model.get("last_modified", ""),
+        "size": model.get("size"),
+        "mimetype": model.get("mimetype"),
+        "format": model.get("format") or "",
+        "fetch": False,
+    }
+    if model.get("content") is not None:
+        row["content"] = model["content"]
+    return row
+
+
+@app.websocket("/tables")
+async def subscribe_tables(websocket: WebSocket) -> None:
+    """
+    Sends a snapshot of all the tables, then the diff of every update.
+    """
+    await websocket.accept()
+    queue = tables.subscribe()
+    # Clients only listen: receiving notices a disconnection even when
+    # there is nothing to send.
+    sender = asyncio.ensure_future(send_messages(websocket, queue))
+    receiver = asyncio.ensure_future(wait_for_disconnect(websocket))
+    try:
+        done, _ = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                raise error
+    finally:
+        sender.cancel()
+        receiver.cancel()
+        tables.unsubscribe(queue)
+
+
+async def send_messages(websocket: WebSocket, queue: "asyncio.Queue[Dict[str, Any]]") -> None:
+    while True:
+        await websocket.send_json(await queue.get())
+
+
+async def wait_for_disconnect(websocket: WebSocket) -> None:
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+
+@app.on_event("startup")
+async def start_refreshing() -> None:
+    if REFRESH_INTERVAL > 0:
+        asyncio.ensure_future(refresh_periodically())
+    if WATCH_INTERVAL > 0:
+        watcher = ContentsWatcher(
+            tables, jupyter, content_row, root_dir=CONTENTS_ROOT, interval=WATCH_INTERVAL
+        )
+        asyncio.ensure_future(watcher.run())
+
+
+async def refresh_periodically() -> None:
+    while True:
+        try:
+            await refresh_kernels()
+            await refresh_sessions()
+            await refresh_status()
+        except Exception:
+            # E.g. the Jupyter server is down, or its REST models changed.
+            log.exception("Refreshing tables failed")
+        await asyncio.sleep(REFRESH_INTERVAL)
+
 
 @app.post("/kernelspecs/refresh")
-def refresh_kernelspecs() -> None:
+async def refresh_kernelspecs() -> None:
     """
     Update the kernelspecs table.
     """
-    ...
+    model = await run_in_threadpool(jupyter.get, "kernelspecs")
+    tables.replace(
+        "kernelspecs",
+        {
+            name: {
+                "kernelspec": {
+                    "default": name == model["default"],
+                    "name": name,
+                    "KernelSpecFile": spec["spec"],
+                    "resources": spec["resources"],
+                }
+            }
+            for name, spec in model["kernelspecs"].items()
+        },
+    )
 
 
 @app.post("/status/refresh")
-def refresh_status() -> None:
+async def refresh_status() -> None:
     """
     Update the status table.
     """
-    ...
+    model = await run_in_threadpool(jupyter.get, "status")
+    tables.replace(
+        "status",
+        {
+            "status": {
+                "started": model["started"],
+                "last_activity": model["last_activity"],
+                "connections": model["connections"],
+                "kernels": model["kernels"],
+            }
+        },
+    )
 
 
 @app.post("/terminals", response_model=str)
-def create_terminal() -> str:
+async def create_terminal() -> str:
     """
     Creates a new terminal and returns the name.
     """
-    ...
+    model = await run_in_threadpool(jupyter.post, "terminals")
+    tables.upsert("terminals", model["name"], {"name": model["name"]})
+    return model["name"]
 
 
 @app.delete("/terminals")
-def delete_terminal(name: str) -> None:
+async def delete_terminal(name: str) -> None:
     """
     Deletes a terminal.
     """
-    ...
+    await run_in_threadpool(jupyter.delete, f"terminals/{name}")
+    tables.remove("terminals", name)
 
 
 @app.post("/kernels/refresh")
-def refresh_kernels() -> None:
+async def refresh_kernels() -> None:
     """
     Update the kernels table.
     """
-    ...
+    models = await run_in_threadpool(jupyter.get, "kernels")
+    tables.replace("kernels", {model["id"]: kernel_row(model) for model in models})
 
 
 @app.post("/kernels", response_model=str)
-def create_kernel(name: str) -> str:
+async def create_kernel(name: str) -> str:
     """
     Creates a new kernel and returns the ID
     """
-    ...
+    model = await run_in_threadpool(jupyter.post, "kernels", {"name": name})
+    tables.upsert("kernels", model["id"], kernel_row(model))
+    return model["id"]
 
 
 @app.delete("/kernels")
-def delete_kernel(id: str) -> None:
+async def delete_kernel(id: str) -> None:
     """
     Kills a kernel
     """
-    ...
+    await run_in_threadpool(jupyter.delete, f"kernels/{id}")
+    tables.remove("kernels", id)
 
 
 @app.post("/kernels/interrupt")
-def interrupt_kernel(id: str) -> None:
+async def interrupt_kernel(id: str) -> None:
     """
     Interrupts a kernel
     """
-    ...
+    await run_in_threadpool(jupyter.post, f"kernels/{id}/interrupt")
 
 
 @app.post("/sessions/refresh")
-def refresh_sessions() -> None:
+async def refresh_sessions() -> None:
     """
     Refresh sessions.
     """
-    ...
+    models = await run_in_threadpool(jupyter.get, "sessions")
+    tables.replace("sessions", {model["id"]: session_row(model) for model in models})
 
 
 @app.delete("/sessions")
-def delete_sessions(id: str) -> None:
+async def delete_sessions(id: str) -> None:
     """
     Deletes a session.
     """
-    ...
+    await run_in_threadpool(jupyter.delete, f"sessions/{id}")
+    tables.remove("sessions", id)
 
 
 @app.post("/sessions", response_model=str)
-def create_session(
+async def create_session(
     path: str,
     type: str,
     name: Optional[str] = None,
@@ -101,11 +271,19 @@ def create_session(
     """
     Creates a new session or returns existing one if path exists
     """
-    ...
+    kernel: Dict[str, str] = {}
+    if kernel_id is not None:
+        kernel["id"] = kernel_id
+    elif kernel_name is not None:
+        kernel["name"] = kernel_name
+    body = {"path": path, "type": type, "name": name or "", "kernel": kernel}
+    model = await run_in_threadpool(jupyter.post, "sessions", body)
+    tables.upsert("sessions", model["id"], session_row(model))
+    return model["id"]
 
 
 @app.patch("/sessions")
-def update_session(
+async def update_session(
     id: str,
     path: Optional[str] = None,
     name: Optional[str] = None,
@@ -116,24 +294,42 @@ def update_session(
     """
     Updates an existing session.
     """
-    ...
+    body: Dict[str, Any] = {
+        k: v for k, v in {"path": path, "name": name, "type": type}.items() if v is not None
+    }
+    if kernel_id is not None:
+        body["kernel"] = {"id": kernel_id}
+    elif kernel_name is not None:
+        body["kernel"] = {"name": kernel_name}
+    model = await run_in_threadpool(jupyter.patch, f"sessions/{id}", body)
+    tables.upsert("sessions", model["id"], session_row(model))
 
 
 @app.post("/content/refresh", response_model=str)
-def refresh_content(
+async def refresh_content(
     path: str,
     content: Optional[bool] = False,
     type: Optional[str] = None,
     format: Optional[str] = None,
 ) -> str:
     """
-    Updates the content and returns the ID
+    Adds or updates the content and returns the ID.
+
+    The row is then kept up to date with the file until it is removed.
     """
-    ...
+    model = await run_in_threadpool(
+        jupyter.get,
+        f"contents/{path}",
+        content=int(bool(content)),
+        type=type,
+        format=format,
+    )
+    tables.upsert("contents", model["path"], content_row(model))
+    return model["path"]
 
 
 @app.post("/content", response_model=str)
-def create_content(
+async def create_content(
     copy_from: Optional[str] = None,
     ext: Optional[str] = None,
     type: Optional[str] = None,
@@ -142,23 +338,30 @@ def create_content(
     """
     Creates new content and returns the ID.
     """
-    ...
+    body = {k: v for k, v in {"copy_from": copy_from, "ext": ext, "type": type}.items() if v is not None}
+    model = await run_in_threadpool(jupyter.post, f"contents/{path}", body)
+    tables.upsert("contents", model["path"], content_row(model))
+    return model["path"]
 
 
 @app.delete("/content")
-def delete_content(id: str) -> None:
+async def delete_content(id: str) -> None:
     """
     Deletes the content
     """
-    ...
+    await run_in_threadpool(jupyter.delete, f"contents/{id}")
+    tables.remove("contents", id)
 
 
 @app.patch("/content")
-def rename_content(id: str, new_path: str) -> None:
+async def rename_content(id: str, new_path: str) -> None:
     """
     Renames the content
     """
-    ...
+    model = await run_in_threadpool(jupyter.patch, f"contents/{id}", {"path": new_path})
+    tables.remove("contents", id)
+    tables.upsert("contents", model["path"], content_row(model))
 
 
-print(json.dumps(app.openapi()))
+if __name__ == "__main__":
+    print(json.dumps(app.openapi()))
@@ -0,0 +1,135 @@
+"""
+In memory tables of the Jupyter server state, publishing row diffs to subscribers.
+"""
+
+import asyncio
+from typing import *
+
+Row = Dict[str, Any]
+
+
+class Diff(NamedTuple):
+    """
+    Changes to a table. `changed` only holds the fields that changed in each row.
+    """
+
+    table: str
+    added: Dict[str, Row]
+    changed: Dict[str, Row]
+    removed: List[str]
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "type": "diff",
+            "table": self.table,
+            "added": self.added,
+            "changed": self.changed,
+            "removed": self.removed,
+        }
+
+
+class Table:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.rows: Dict[str, Row] = {}
+
+    def replace(self, rows: Dict[str, Row]) -> Diff:
+        """
+        Replace all the rows of the table, returning what changed.
+        """
+        removed = [id for id in self.rows if id not in rows]
+        for id in removed:
+            del self.rows[id]
+        diff = self._merge(rows)
+        return diff._replace(removed=removed)
+
+    def upsert(self, id: str, row: Row) -> Diff:
+        """
+        Add a row or update the given fields of an existing one.
+        """
+        return self._merge({id: row})
+
+    def remove(self, id: str) -> Diff:
+        if self.rows.pop(id, None) is None:
+            return Diff(self.name, {}, {}, [])
+        return Diff(self.name, {}, {}, [id])
+
+    def _merge(self, rows: Dict[str, Row]) -> Diff:
+        added: Dict[str, Row] = {}
+        changed: Dict[str, Row] = {}
+        for id, row in rows.items():
+            current = self.rows.get(id)
+            if current is None:
+                self.rows[id] = dict(row)
+                added[id] = row
+                continue
+            fields = {k: v for k, v in row.items() if current.get(k, None) != v}
+            if fields:
+                current.update(fields)
+                changed[id] = fields
+        return Diff(self.name, added, changed, [])
+
+
+class Tables:
+    """
+    The tables served to clients. Each subscriber gets a snapshot and then every diff.
+
+    A subscriber with `max_pending` messages not sent yet is resynced: its
+    queue is replaced with a snapshot of the tables, so a slow client does
+    not buffer diffs without limit.
+    """
+
+    def __init__(self, names: Iterable[str], max_pending: int = 100) -> None:
+        self.tables = {name: Table(name) for name in names}
+        self.max_pending = max(1, max_pending)
+        self.subscribers: Set["asyncio.Queue[Dict[str, Any]]"] = set()
+
+    def __getitem__(self, name: str) -> Table:
+        return self.tables[name]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "type": "snapshot",
+            "tables": {
+                name: {id: dict(row) for id, row in table.rows.items()}
+                for name, table in self.tables.items()
+            },
+        }
+
+    def subscribe(self) -> "asyncio.Queue[Dict[str, Any]]":
+        queue: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(self.max_pending)
+        queue.put_nowait(self.snapshot())
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: "asyncio.Queue[Dict[str, Any]]") -> None:
+        self.subscribers.discard(queue)
+
+    def publish(self, diff: Diff) -> None:
+        if not diff:
+            return
+        message = diff.to_json()
+        snapshot = None
+        for queue in self.subscribers:
+            if not queue.full():
+                queue.put_nowait(message)
+                continue
+            # The tables already hold this diff, so the snapshot replaces
+            # every pending message.
+            while not queue.empty():
+                queue.get_nowait()
+            if snapshot is None:
+                snapshot = self.snapshot()
+            queue.put_nowait(snapshot)
+
+    def replace(self, name: str, rows: Dict[str, Row]) -> None:
+        self.publish(self.tables[name].replace(rows))
+
+    def upsert(self, name: str, id: str, row: Row) -> None:
+        self.publish(self.tables[name].upsert(id, row))
+
+    def remove(self, name: str, id: str) -> None:
+        self.publish(self.tables[name].remove(id))
@@ -0,0 +1,79 @@
+import asyncio
+
+from jupyter_rtc.tables import Diff, Table, Tables
+
+
+def drain(queue):
+    messages = []
+    while not queue.empty():
+        messages.append(queue.get_nowait())
+    return messages
+
+
+def test_replace_diffs_only_the_changed_fields():
+    table = Table("kernels")
+    assert table.replace({"a": {"name": "a", "state": "idle"}}) == Diff(
+        "kernels", {"a": {"name": "a", "state": "idle"}}, {}, []
+    )
+    diff = table.replace({"a": {"name": "a", "state": "busy"}, "b": {"name": "b"}})
+    assert diff == Diff("kernels", {"b": {"name": "b"}}, {"a": {"state": "busy"}}, [])
+    assert table.replace({"b": {"name": "b"}}) == Diff("kernels", {}, {}, ["a"])
+    assert not table.replace({"b": {"name": "b"}})
+    assert table.rows == {"b": {"name": "b"}}
+
+
+def test_upsert_and_remove():
+    table = Table("contents")
+    table.upsert("a", {"path": "a", "size": 1})
+    assert table.upsert("a", {"size": 2}) == Diff("contents", {}, {"a": {"size": 2}}, [])
+    assert table.rows["a"] == {"path": "a", "size": 2}
+    assert table.remove("a") == Diff("contents", {}, {}, ["a"])
+    assert not table.remove("a")
+
+
+def test_subscribers_get_a_snapshot_then_the_diffs():
+    async def run():
+        tables = Tables(["kernels", "sessions"])
+        tables.upsert("kernels", "a", {"name": "a"})
+        queue = tables.subscribe()
+        tables.upsert("kernels", "a", {"name": "a"})
+        tables.upsert("sessions", "s", {"path": "p"})
+        tables.remove("kernels", "a")
+        tables.unsubscribe(queue)
+        tables.remove("sessions", "s")
+        return drain(queue)
+
+    snapshot, added, removed = asyncio.run(run())
+    assert snapshot == {
+        "type": "snapshot",
+        "tables": {"kernels": {"a": {"name": "a"}}, "sessions": {}},
+    }
+    assert added == {
+        "type": "diff",
+        "table": "sessions",
+        "added": {"s": {"path": "p"}},
+        "changed": {},
+        "removed": [],
+    }
+    assert (removed["table"], removed["removed"]) == ("kernels", ["a"])
+
+
+def test_full_queue_is_replaced_with_a_snapshot():
+    async def run():
+        tables = Tables(["kernels"], max_pending=2)
+        slow, fast = tables.subscribe(), tables.subscribe()
+        # The initial snapshot and one diff fill the queue, the next diff
+        # is replaced with a snapshot, then it is full again at the fourth.
+        for i in range(4):
+            tables.upsert("kernels", str(i), {"name": str(i)})
+            drain(fast)
+        return drain(slow)
+
+    messages = asyncio.run(run())
+    # The snapshot replaces the pending messages and holds the last diff.
+    assert messages == [
+        {
+            "type": "snapshot",
+            "tables": {"kernels": {str(i): {"name": str(i)} for i in range(4)}},
+        }
+    ]
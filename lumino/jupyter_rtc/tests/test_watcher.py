@@ -0,0 +1,94 @@
+import asyncio
+import urllib.error
+
+from jupyter_rtc.tables import Tables
+from jupyter_rtc.watcher import ContentsWatcher
+
+
+class FakeJupyter:
+    """Serves `models[path]`, or the next of a list of models on each request."""
+
+    def __init__(self, models):
+        self.models = models
+        self.requests = []
+
+    def get(self, path, content=0):
+        path = path[len("contents/"):]
+        self.requests.append((path, content))
+        model = self.models.get(path)
+        if isinstance(model, list):
+            model = model.pop(0) if len(model) > 1 else model[0]
+        if model is None:
+            raise urllib.error.HTTPError(path, 404, "Not Found", {}, None)
+        model = dict(model, path=path)
+        if content:
+            model["content"] = f"content of {path}"
+        return model
+
+
+def content_row(model):
+    row = {"path": model["path"], "last_modified": model["last_modified"]}
+    if "content" in model:
+        row["content"] = model["content"]
+    return row
+
+
+def watcher(models, root_dir=None):
+    tables = Tables(["contents"])
+    jupyter = FakeJupyter(models)
+    return ContentsWatcher(
+        tables, jupyter, content_row, root_dir=root_dir, debounce=0.01, use_inotify=False
+    )
+
+
+def check(watcher):
+    asyncio.run(watcher.check())
+    return watcher.tables["contents"].rows
+
+
+def test_polling_fallback_updates_and_removes_rows():
+    w = watcher({"a": {"last_modified": "1", "size": 1}, "b": {"last_modified": "1", "size": 1}})
+    w.tables.upsert("contents", "a", {"path": "a", "last_modified": "1"})
+    w.tables.upsert("contents", "b", {"path": "b", "last_modified": "1", "content": "old"})
+    queue = w.tables.subscribe()
+    queue.get_nowait()
+    check(w)
+    assert queue.empty()
+
+    w.jupyter.models["a"] = None
+    w.jupyter.models["b"] = {"last_modified": "2", "size": 1}
+    rows = check(w)
+    assert rows == {"b": {"path": "b", "last_modified": "2", "content": "content of b"}}
+    assert sorted(queue.get_nowait()["removed"] for _ in range(2)) == [[], ["a"]]
+    # Only the rows holding a content fetch it again.
+    assert ("b", 1) in w.jupyter.requests
+
+
+def test_changes_are_applied_once_settled():
+    w = watcher({"a": {"last_modified": "1", "size": 1}})
+    w.tables.upsert("contents", "a", {"path": "a", "last_modified": "1"})
+    check(w)
+    # Still being written when it is seen again after the debounce.
+    w.jupyter.models["a"] = [
+        {"last_modified": "2", "size": 1},
+        {"last_modified": "3", "size": 2},
+    ]
+    assert check(w)["a"]["last_modified"] == "1"
+    assert check(w)["a"]["last_modified"] == "3"
+
+
+def test_watches_the_shared_filesystem(tmp_path):
+    (tmp_path / "a").write_text("x")
+    w = watcher({"a": {"last_modified": "2", "size": 2}}, root_dir=str(tmp_path))
+    w.tables.upsert("contents", "a", {"path": "a", "last_modified": "1"})
+    check(w)
+    assert w.jupyter.requests == []
+
+    (tmp_path / "a").write_text("xy")
+    assert check(w)["a"]["last_modified"] == "2"
+    assert w.jupyter.requests == [("a", 0)]
+
+    (tmp_path / "a").unlink()
+    assert check(w) == {}
+    # Deleted rows are not watched anymore.
+    assert w.signatures == {}
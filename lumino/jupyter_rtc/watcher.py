@@ -0,0 +1,220 @@
+"""
+Keep the rows of the `contents` table up to date with the files they describe.
+
+When the table server shares the filesystem of the Jupyter server
+(`root_dir` is its root directory), the rows are watched on disk: with
+inotify through watchdog when installed, by polling their stat otherwise.
+Otherwise the Jupyter REST API is polled for the models of the rows.
+
+Only the paths in the table are watched, so the cost does not depend on
+the number of files served.
+"""
+
+import asyncio
+import logging
+import os
+import urllib.error
+from typing import *
+
+from .jupyter import JupyterClient
+from .tables import Row, Tables
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+
+log = logging.getLogger(__name__)
+
+# (mtime, size) on disk, (last_modified, size) through REST, None when missing.
+Signature = Optional[Tuple[Any, Any]]
+
+
+class ContentsWatcher:
+    """
+    Upsert the row of a changed path and remove the row of a deleted one.
+
+    A change is only applied once its signature is the same `debounce`
+    seconds after it was seen, so a burst of writes is fetched once.
+    """
+
+    def __init__(
+        self,
+        tables: Tables,
+        jupyter: JupyterClient,
+        content_row: Callable[[Dict[str, Any]], Row],
+        root_dir: Optional[str] = None,
+        interval: float = 2.0,
+        debounce: float = 0.2,
+        use_inotify: bool = True,
+    ) -> None:
+        self.tables = tables
+        self.jupyter = jupyter
+        self.content_row = content_row
+        self.root_dir = root_dir
+        self.interval = interval
+        self.debounce = debounce
+        self.signatures: Dict[str, Signature] = {}
+        self.touched: Set[str] = set()
+        self.wake: Optional[asyncio.Event] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.observer = None
+        self.directories: Dict[str, Any] = {}
+        self.use_inotify = use_inotify and root_dir is not None and Observer is not None
+
+    @property
+    def rows(self) -> Dict[str, Row]:
+        return self.tables["contents"].rows
+
+    def os_path(self, path: str) -> str:
+        return os.path.join(cast(str, self.root_dir), path.lstrip("/"))
+
+    async def run(self) -> None:
+        self.loop = asyncio.get_event_loop()
+        self.wake = asyncio.Event()
+        if self.use_inotify:
+            self.observer = Observer()
+            self.observer.start()
+        try:
+            while True:
+                try:
+                    await self.check()
+                except Exception:
+                    # E.g. the Jupyter server is down.
+                    log.exception("Watching contents failed")
+                try:
+                    await asyncio.wait_for(self.wake.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self.wake.clear()
+        finally:
+            if self.observer is not None:
+                self.observer.stop()
+                self.observer = None
+                self.directories.clear()
+
+    async def check(self) -> None:
+        """
+        Apply the settled changes to the watched paths.
+        """
+        await self.sync()
+        if self.observer is None:
+            paths = set(self.signatures)
+        else:
+            paths = self.touched & set(self.signatures)
+            self.touched.clear()
+        seen = {}
+        for path in paths:
+            signature, _model = await self.signature(path)
+            if signature != self.signatures[path]:
+                seen[path] = signature
+        if not seen:
+            return
+        await asyncio.sleep(self.debounce)
+        for path, signature in seen.items():
+            if path not in self.signatures:
+                continue
+            current, model = await self.signature(path)
+            # Still changing: seen again on the next check.
+            if current == signature:
+                await self.apply(path, current, model)
+
+    async def sync(self) -> None:
+        """
+        Follow the rows added to and removed from the table.
+
+        The row of a new path is up to date, so its signature is only recorded.
+        """
+        for path in set(self.signatures) - set(self.rows):
+            del self.signatures[path]
+            self.unschedule(path)
+        for path in set(self.rows) - set(self.signatures):
+            self.signatures[path], _model = await self.signature(path)
+            self.schedule(path)
+
+    async def signature(self, path: str) -> Tuple[Signature, Optional[Dict[str, Any]]]:
+        """
+        Return the signature of a path, and its model when it was fetched for it.
+        """
+        if self.root_dir is not None:
+            try:
+                st = os.stat(self.os_path(path))
+            except OSError:
+                return None, None
+            return (st.st_mtime_ns, st.st_size), None
+        model = await self.fetch(path, content=False)
+        if model is None:
+            return None, None
+        return (model.get("last_modified"), model.get("size")), model
+
+    async def fetch(self, path: str, content: bool) -> Optional[Dict[str, Any]]:
+        try:
+            return await asyncio.get_event_loop().run_in_executor(
+                None,
+                lambda: self.jupyter.get(f"contents/{path}", content=int(content)),
+            )
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+
+    async def apply(self, path: str, signature: Signature, model: Optional[Dict[str, Any]]) -> None:
+        # The content is only fetched for the rows that hold it.
+        content = "content" in self.rows.get(path, {})
+        if signature is not None and (model is None or content):
+            model = await self.fetch(path, content)
+        # Removed while it was fetched.
+        if path not in self.signatures:
+            return
+        if model is None:
+            self.tables.remove("contents", path)
+            del self.signatures[path]
+            self.unschedule(path)
+            return
+        self.signatures[path] = signature
+        self.tables.upsert("contents", path, self.content_row(model))
+
+    def schedule(self, path: str) -> None:
+        if self.observer is None:
+            return
+        directory = os.path.dirname(self.os_path(path))
+        if directory not in self.directories:
+            handler = _EventHandler(self)
+            self.directories[directory] = [
+                self.observer.schedule(handler, directory, recursive=False),
+                0,
+            ]
+        self.directories[directory][1] += 1
+
+    def unschedule(self, path: str) -> None:
+        if self.observer is None:
+            return
+        directory = os.path.dirname(self.os_path(path))
+        self.directories[directory][1] -= 1
+        if self.directories[directory][1] == 0:
+            self.observer.unschedule(self.directories.pop(directory)[0])
+
+    def touch(self, path: str) -> None:
+        self.touched.add(path)
+        if self.wake is not None:
+            self.wake.set()
+
+
+if Observer is not None:
+
+    class _EventHandler(FileSystemEventHandler):
+        """
+        Forwards the events of a directory to the watcher, from the observer thread.
+        """
+
+        def __init__(self, watcher: ContentsWatcher) -> None:
+            self.watcher = watcher
+
+        def on_any_event(self, event: Any) -> None:
+            for os_path in (event.src_path, getattr(event, "dest_path", None)):
+                if not os_path:
+                    continue
+                path = os.path.relpath(os_path, self.watcher.root_dir)
+                loop = cast(asyncio.AbstractEventLoop, self.watcher.loop)
+                loop.call_soon_threadsafe(self.watcher.touch, path)
@@ -32,13 +32,22 @@ export class CollaborationClient implements IServerAdapter {
   onUndo!: ((transaction: Datastore.Transaction) => void) | null;
   onRedo!: ((transaction: Datastore.Transaction) => void) | null;
 
-  constructor(private options: { url: string; onLoad: () => void }) {}
+  /**
+   * Version of the relay log this client has seen, asked again on reconnection.
+   */
+  private version: number | null = null;
+
+  constructor(
+    private options: { url: string; onLoad: () => void; onStale?: () => void }
+  ) {}
 
   broadcast(transaction: Datastore.Transaction): void {
     if (this.state.label !== "connected") {
       throw new Error("Cannot broadcast transactions before connected");
     }
-    this.state.socket.emit("transaction", transaction);
+    this.state.socket.emit("transaction", transaction, (version: number) =>
+      this.seen(version)
+    );
   }
 
   undo(): Promise<void> {
@@ -57,19 +66,45 @@ export class CollaborationClient implements IServerAdapter {
     }
     const socket = io(this.options.url);
 
-    socket.on("transactions", (transactions: Array<Datastore.Transaction>) => {
-      transactions.map((t) => onRemoteTransaction(t));
-      this.options.onLoad();
+    // Once reconnected, only the transactions missed meanwhile are sent.
+    socket.on("reconnect_attempt", () => {
+      if (this.version !== null) {
+        socket.io.opts.query = { since: this.version };
+      }
     });
-    socket.on("transaction", (t: Datastore.Transaction) =>
-      onRemoteTransaction(t)
+    socket.on(
+      "transactions",
+      (transactions: Array<Datastore.Transaction>, version?: number) => {
+        transactions.map((t) => onRemoteTransaction(t));
+        this.seen(version);
+        this.options.onLoad();
+      }
     );
+    socket.on("transaction", (t: Datastore.Transaction, version?: number) => {
+      onRemoteTransaction(t);
+      this.seen(version);
+    });
+    // The transactions missed were folded by the relay: they can not be
+    // sent without the ones this client already has.
+    socket.on("stale", () => {
+      if (this.options.onStale) {
+        this.options.onStale();
+      } else {
+        console.warn(`Missed transactions from ${this.options.url}, reload to resync`);
+      }
+    });
     this.state = {
       label: "connected",
       socket,
     };
   }
 
+  private seen(version: number | undefined): void {
+    if (version !== undefined && (this.version === null || version > this.version)) {
+      this.version = version;
+    }
+  }
+
   /**
    * Closes last socket and cleans up all observables.
    */
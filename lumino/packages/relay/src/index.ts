@@ -1,6 +1,7 @@
 import http from "http";
 import socketio from "socket.io";
 import { Datastore } from "@lumino/datastore";
+import { TransactionLog } from "./log";
 
 const handler: http.RequestListener = (_req, res) => {
   res.writeHead(404);
@@ -13,13 +14,31 @@ const io = socketio(app);
 
 app.listen(8888);
 
-const transactions: Datastore.Transaction[] = [];
+const transactions = new TransactionLog(
+  process.env.RTC_RELAY_DIR || ".rtc-relay",
+  Number(process.env.RTC_RELAY_CHECKPOINT_INTERVAL) || 100
+);
 
 io.on("connection", (socket) => {
-  // Send list of inital transactionon start.
-  socket.emit("transactions", transactions);
-  socket.on("transaction", (transaction: Datastore.Transaction) => {
-    transactions.push(transaction);
-    socket.broadcast.emit("transaction", transaction);
-  });
+  // A reconnecting client passes the version of the log it has seen, and is
+  // only sent the transactions added since. New clients are sent the
+  // checkpoint and the transactions added since it.
+  const since = socket.handshake.query.since;
+  const missed =
+    since === undefined ? transactions.transactions : transactions.since(Number(since));
+  if (missed === null) {
+    socket.emit("stale");
+  } else {
+    socket.emit("transactions", missed, transactions.version);
+  }
+  socket.on(
+    "transaction",
+    (transaction: Datastore.Transaction, ack?: (version: number) => void) => {
+      const version = transactions.add(transaction);
+      socket.broadcast.emit("transaction", transaction, version);
+      if (ack) {
+        ack(version);
+      }
+    }
+  );
 });
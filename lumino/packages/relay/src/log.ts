@@ -0,0 +1,410 @@
+import fs from "fs";
+import path from "path";
+import { Datastore } from "@lumino/datastore";
+
+/**
+ * A splice of a list or text field patch.
+ *
+ * Inserted and removed elements are identified by ids, which also give
+ * their position, so splices can be applied in any order and an element
+ * inserted then removed can be dropped from both splices.
+ */
+type Splice = {
+  removedIds: string[];
+  insertedIds: string[];
+  removedValues?: unknown[];
+  insertedValues?: unknown[];
+  removedText?: string;
+  insertedText?: string;
+};
+
+/**
+ * A field patch which carries the id of the value it sets, as register
+ * fields and map field entries do. The value with the greatest id wins.
+ */
+type Versioned = { id: string; value: unknown };
+
+/**
+ * The folded state of a field.
+ */
+type FieldState = SplicesState | RegisterState | MapState;
+type SplicesState = { kind: "splices"; splices: Splice[]; inserted: Map<string, Splice> };
+type RegisterState = { kind: "register"; patch: Versioned };
+type MapState = { kind: "map"; entries: { [key: string]: Versioned } };
+
+type RecordPatch = { [field: string]: unknown };
+type TablePatch = { [recordId: string]: RecordPatch };
+type Patch = { [schemaId: string]: TablePatch };
+
+function isSplice(value: any): value is Splice {
+  return (
+    value !== null &&
+    typeof value === "object" &&
+    Array.isArray(value.removedIds) &&
+    Array.isArray(value.insertedIds)
+  );
+}
+
+function isVersioned(value: any): value is Versioned {
+  return (
+    value !== null &&
+    typeof value === "object" &&
+    typeof value.id === "string" &&
+    "value" in value
+  );
+}
+
+function cloneSplice(splice: Splice): Splice {
+  return {
+    ...splice,
+    removedIds: [...splice.removedIds],
+    insertedIds: [...splice.insertedIds],
+    ...(splice.removedValues && { removedValues: [...splice.removedValues] }),
+    ...(splice.insertedValues && { insertedValues: [...splice.insertedValues] }),
+  };
+}
+
+/**
+ * Remove the element at `index` from the inserted or removed side of a splice.
+ */
+function dropElement(splice: Splice, side: "inserted" | "removed", index: number) {
+  const ids = side === "inserted" ? splice.insertedIds : splice.removedIds;
+  ids.splice(index, 1);
+  const values = side === "inserted" ? splice.insertedValues : splice.removedValues;
+  if (values) {
+    values.splice(index, 1);
+  }
+  const textKey = side === "inserted" ? "insertedText" : "removedText";
+  const text = splice[textKey];
+  if (text !== undefined) {
+    splice[textKey] = text.slice(0, index) + text.slice(index + 1);
+  }
+}
+
+/**
+ * Fold a field patch into the state of the field.
+ *
+ * Returns the new state, or `null` when the patch can not be folded.
+ */
+function foldField(state: FieldState | undefined, patch: unknown): FieldState | null {
+  if (Array.isArray(patch) && patch.every(isSplice)) {
+    if (state && state.kind !== "splices") {
+      return null;
+    }
+    const folded: SplicesState = state || { kind: "splices", splices: [], inserted: new Map() };
+    for (const original of patch) {
+      const splice = cloneSplice(original);
+      // Elements removed by this splice and inserted since the checkpoint
+      // started are dropped from both splices.
+      for (let i = splice.removedIds.length - 1; i >= 0; i--) {
+        const id = splice.removedIds[i];
+        const insertion = folded.inserted.get(id);
+        if (insertion) {
+          dropElement(insertion, "inserted", insertion.insertedIds.indexOf(id));
+          dropElement(splice, "removed", i);
+          folded.inserted.delete(id);
+        }
+      }
+      splice.insertedIds.forEach((id) => folded.inserted.set(id, splice));
+      folded.splices.push(splice);
+    }
+    folded.splices = folded.splices.filter(
+      (s) => s.insertedIds.length > 0 || s.removedIds.length > 0
+    );
+    return folded;
+  }
+  if (isVersioned(patch)) {
+    if (state && state.kind !== "register") {
+      return null;
+    }
+    if (!state || patch.id > state.patch.id) {
+      return { kind: "register", patch };
+    }
+    return state;
+  }
+  if (
+    patch !== null &&
+    typeof patch === "object" &&
+    Object.values(patch as object).every(isVersioned)
+  ) {
+    if (state && state.kind !== "map") {
+      return null;
+    }
+    const folded: MapState = state || { kind: "map", entries: {} };
+    for (const [key, entry] of Object.entries(patch as { [key: string]: Versioned })) {
+      const current = folded.entries[key];
+      if (!current || entry.id > current.id) {
+        folded.entries[key] = entry;
+      }
+    }
+    return folded;
+  }
+  return null;
+}
+
+function fieldPatch(state: FieldState): unknown {
+  switch (state.kind) {
+    case "splices":
+      return state.splices;
+    case "register":
+      return state.patch;
+    case "map":
+      return state.entries;
+  }
+}
+
+/**
+ * The checkpoint data saved on disk.
+ */
+type CheckpointData = {
+  end: number;
+  tables: Datastore.Transaction[];
+  residual: Datastore.Transaction[];
+};
+
+/**
+ * Transactions folded into one transaction per table.
+ *
+ * Patches of list and text fields are merged, dropping the elements
+ * inserted then removed, and only the latest value of register and map
+ * fields is kept. The patches of another shape are kept in residual
+ * transactions, in order, with the ids of the transactions they come from.
+ * Once a field has a residual patch, its later patches are residual too,
+ * so they are not applied before it.
+ */
+export class Checkpoint {
+  /**
+   * Sequence number of the last transaction folded.
+   */
+  get end(): number {
+    return this._end;
+  }
+
+  /**
+   * The transactions replaying the checkpoint: the tables, then the
+   * residual transactions.
+   *
+   * The ids of the tables only depend on the transactions folded, so a
+   * datastore skips a checkpoint it already applied, e.g. after a restart.
+   */
+  get transactions(): Datastore.Transaction[] {
+    const tables: Datastore.Transaction[] = [];
+    for (const [schemaId, records] of this.tables) {
+      const tablePatch: TablePatch = {};
+      for (const [recordId, record] of records) {
+        if (record.size > 0) {
+          const recordPatch: RecordPatch = {};
+          record.forEach((state, field) => (recordPatch[field] = fieldPatch(state)));
+          tablePatch[recordId] = recordPatch;
+        }
+      }
+      tables.push({
+        id: `checkpoint:${schemaId}:${this._end}`,
+        storeId: 0,
+        patch: { [schemaId]: tablePatch },
+      } as Datastore.Transaction);
+    }
+    return [...tables, ...this.residual];
+  }
+
+  /**
+   * Fold the transaction numbered `seq`.
+   */
+  fold(transaction: Datastore.Transaction, seq: number): void {
+    const residual: Patch = {};
+    for (const [schemaId, tablePatch] of Object.entries(transaction.patch as Patch)) {
+      let records = this.tables.get(schemaId);
+      if (!records) {
+        records = new Map();
+        this.tables.set(schemaId, records);
+      }
+      for (const [recordId, recordPatch] of Object.entries(tablePatch)) {
+        let record = records.get(recordId);
+        if (!record) {
+          record = new Map();
+          records.set(recordId, record);
+        }
+        for (const [field, patch] of Object.entries(recordPatch)) {
+          const key = JSON.stringify([schemaId, recordId, field]);
+          const state = this.frozen.has(key) ? null : foldField(record.get(field), patch);
+          if (state) {
+            record.set(field, state);
+          } else {
+            this.frozen.add(key);
+            const residualTable = (residual[schemaId] = residual[schemaId] || {});
+            (residualTable[recordId] = residualTable[recordId] || {})[field] = patch;
+          }
+        }
+      }
+    }
+    if (Object.keys(residual).length > 0) {
+      this.residual.push({
+        id: transaction.id,
+        storeId: transaction.storeId,
+        patch: residual,
+      } as Datastore.Transaction);
+    }
+    this._end = seq;
+  }
+
+  toJSON(): CheckpointData {
+    const transactions = this.transactions;
+    return {
+      end: this._end,
+      tables: transactions.slice(0, this.tables.size),
+      residual: this.residual,
+    };
+  }
+
+  static fromJSON(data: CheckpointData): Checkpoint {
+    const checkpoint = new Checkpoint();
+    data.tables.forEach((transaction) => checkpoint.fold(transaction, data.end));
+    for (const transaction of data.residual) {
+      for (const [schemaId, tablePatch] of Object.entries(transaction.patch as Patch)) {
+        for (const [recordId, recordPatch] of Object.entries(tablePatch)) {
+          Object.keys(recordPatch).forEach((field) =>
+            checkpoint.frozen.add(JSON.stringify([schemaId, recordId, field]))
+          );
+        }
+      }
+      checkpoint.residual.push(transaction);
+    }
+    checkpoint._end = data.end;
+    return checkpoint;
+  }
+
+  private _end = 0;
+  private tables = new Map<string, Map<string, Map<string, FieldState>>>();
+  private residual: Datastore.Transaction[] = [];
+  private frozen = new Set<string>();
+}
+
+/**
+ * Parse a line of the tail: the number of a transaction and the transaction.
+ */
+function parseTailLine(line: string): [number, Datastore.Transaction] | null {
+  try {
+    const entry = JSON.parse(line);
+    if (!Array.isArray(entry) || typeof entry[0] !== "number") {
+      return null;
+    }
+    return entry as [number, Datastore.Transaction];
+  } catch {
+    return null;
+  }
+}
+
+/**
+ * The transactions received by the relay, as a checkpoint and a tail.
+ *
+ * Transactions are numbered from 1 in the order they are added; the
+ * version of the log is the number of the last one. Every `interval`
+ * transactions, the tail is folded into the checkpoint. The previous tail
+ * is kept in memory, so a client reconnecting within one interval is only
+ * sent the transactions it missed, see `since`.
+ *
+ * The checkpoint and the tail are saved in `directory`, so the relay
+ * recovers its state on restart. Each line of the tail holds the number
+ * of its transaction, and the checkpoint the number of the last one it
+ * folded: a crash before the tail is truncated leaves transactions already
+ * folded in it, and they are skipped on recovery.
+ */
+export class TransactionLog {
+  constructor(readonly directory: string, readonly interval: number = 100) {
+    fs.mkdirSync(directory, { recursive: true });
+    this.checkpointPath = path.join(directory, "checkpoint.json");
+    this.tailPath = path.join(directory, "tail.jsonl");
+    this.recover();
+  }
+
+  /**
+   * The number of the last transaction added.
+   */
+  get version(): number {
+    return this.checkpoint.end + this.tail.length;
+  }
+
+  /**
+   * The transactions to send to a new connection.
+   */
+  get transactions(): Datastore.Transaction[] {
+    return [...this.checkpoint.transactions, ...this.tail];
+  }
+
+  /**
+   * The transactions added after `version`, or `null` if some of them were
+   * folded in a checkpoint before the last one.
+   */
+  since(version: number): Datastore.Transaction[] | null {
+    const start = this.checkpoint.end - this.recent.length;
+    if (!Number.isInteger(version) || version < start || version > this.version) {
+      return null;
+    }
+    return [...this.recent, ...this.tail].slice(version - start);
+  }
+
+  /**
+   * Add a transaction to the log, and return its number.
+   */
+  add(transaction: Datastore.Transaction): number {
+    this.tail.push(transaction);
+    const version = this.version;
+    fs.appendFileSync(this.tailPath, JSON.stringify([version, transaction]) + "\n");
+    if (this.tail.length >= this.interval) {
+      this.compact();
+    }
+    return version;
+  }
+
+  /**
+   * Fold the tail into the checkpoint and save it.
+   */
+  compact(): void {
+    this.tail.forEach((transaction) => this.checkpoint.fold(transaction, this.checkpoint.end + 1));
+    this.recent = this.tail;
+    this.tail = [];
+    const temporary = this.checkpointPath + ".tmp";
+    fs.writeFileSync(temporary, JSON.stringify(this.checkpoint));
+    fs.renameSync(temporary, this.checkpointPath);
+    fs.writeFileSync(this.tailPath, "");
+  }
+
+  private recover(): void {
+    if (fs.existsSync(this.checkpointPath)) {
+      this.checkpoint = Checkpoint.fromJSON(
+        JSON.parse(fs.readFileSync(this.checkpointPath, "utf8"))
+      );
+    }
+    if (fs.existsSync(this.tailPath)) {
+      // The last line may have been cut by a crash while it was written.
+      const lines = fs.readFileSync(this.tailPath, "utf8").split("\n");
+      for (const line of lines) {
+        const entry = parseTailLine(line);
+        if (!entry) {
+          break;
+        }
+        const [seq, transaction] = entry;
+        if (seq > this.version) {
+          this.tail.push(transaction);
+        }
+      }
+    }
+    // Rewritten without the folded and the cut transactions, so the next
+    // ones are not appended after a cut line.
+    fs.writeFileSync(
+      this.tailPath,
+      this.tail
+        .map((transaction, i) => JSON.stringify([this.checkpoint.end + i + 1, transaction]) + "\n")
+        .join("")
+    );
+    if (this.tail.length >= this.interval) {
+      this.compact();
+    }
+  }
+
+  private readonly checkpointPath: string;
+  private readonly tailPath: string;
+  private checkpoint = new Checkpoint();
+  private recent: Datastore.Transaction[] = [];
+  private tail: Datastore.Transaction[] = [];
+}
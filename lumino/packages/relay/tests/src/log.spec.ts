@@ -0,0 +1,211 @@
+// Copyright (c) Jupyter Development Team.
+// Distributed under the terms of the Modified BSD License.
+import { expect } from "chai";
+
+import fs from "fs";
+import os from "os";
+import path from "path";
+
+import { Datastore } from "@lumino/datastore";
+
+import { Checkpoint, TransactionLog } from "../../src/log";
+
+function transaction(
+  id: string,
+  fields: { [field: string]: unknown },
+  schemaId = "schema"
+): Datastore.Transaction {
+  return {
+    id,
+    storeId: 1,
+    patch: { [schemaId]: { record: fields } },
+  } as Datastore.Transaction;
+}
+
+function fold(...transactions: Datastore.Transaction[]): Checkpoint {
+  const checkpoint = new Checkpoint();
+  transactions.forEach((t, i) => checkpoint.fold(t, i + 1));
+  return checkpoint;
+}
+
+function fields(checkpoint: Checkpoint, schemaId = "schema"): any {
+  const table = checkpoint.transactions.find((t) => schemaId in t.patch)!;
+  return (table.patch as any)[schemaId].record;
+}
+
+describe("Checkpoint", () => {
+  it("should drop the elements inserted then removed", () => {
+    const checkpoint = fold(
+      transaction("1", {
+        text: [{ removedIds: [], removedText: "", insertedIds: ["a", "b", "c"], insertedText: "abc" }],
+        list: [{ removedIds: [], removedValues: [], insertedIds: ["x", "y"], insertedValues: [1, 2] }],
+      }),
+      transaction("2", {
+        text: [{ removedIds: ["b"], removedText: "b", insertedIds: ["d"], insertedText: "d" }],
+        list: [{ removedIds: ["x", "y"], removedValues: [1, 2], insertedIds: [], insertedValues: [] }],
+      })
+    );
+    expect(fields(checkpoint)).to.deep.equal({
+      text: [
+        { removedIds: [], removedText: "", insertedIds: ["a", "c"], insertedText: "ac" },
+        { removedIds: [], removedText: "", insertedIds: ["d"], insertedText: "d" },
+      ],
+      list: [],
+    });
+  });
+
+  it("should keep the removal of elements inserted before the checkpoint", () => {
+    const checkpoint = fold(
+      transaction("1", { text: [{ removedIds: ["a"], removedText: "a", insertedIds: [], insertedText: "" }] })
+    );
+    expect(fields(checkpoint).text).to.deep.equal([
+      { removedIds: ["a"], removedText: "a", insertedIds: [], insertedText: "" },
+    ]);
+  });
+
+  it("should keep the register value with the greatest id", () => {
+    const checkpoint = fold(
+      transaction("1", { count: { id: "2", value: "new" } }),
+      transaction("2", { count: { id: "1", value: "old" } })
+    );
+    expect(fields(checkpoint).count).to.deep.equal({ id: "2", value: "new" });
+  });
+
+  it("should keep the map entry with the greatest id for each key", () => {
+    const checkpoint = fold(
+      transaction("1", { tags: { a: { id: "1", value: 1 }, b: { id: "2", value: 2 } } }),
+      transaction("2", { tags: { a: { id: "3", value: 3 } } }),
+      transaction("3", { tags: { b: { id: "0", value: 0 } } })
+    );
+    expect(fields(checkpoint).tags).to.deep.equal({
+      a: { id: "3", value: 3 },
+      b: { id: "2", value: 2 },
+    });
+  });
+
+  it("should keep the patches it can not fold in order, with their ids", () => {
+    const splice = { removedIds: [], insertedIds: ["a"], insertedValues: [1] };
+    const checkpoint = fold(
+      transaction("1", { count: { id: "1", value: 1 } }),
+      transaction("2", { count: [splice], other: { id: "1", value: "kept" } }),
+      // Folded after a residual patch, it would be applied before it.
+      transaction("3", { count: { id: "3", value: 3 } })
+    );
+    const [table, ...residual] = checkpoint.transactions;
+    expect(fields(checkpoint)).to.deep.equal({
+      count: { id: "1", value: 1 },
+      other: { id: "1", value: "kept" },
+    });
+    expect(table.id).to.equal("checkpoint:schema:3");
+    expect(residual).to.deep.equal([
+      { id: "2", storeId: 1, patch: { schema: { record: { count: [splice] } } } },
+      { id: "3", storeId: 1, patch: { schema: { record: { count: { id: "3", value: 3 } } } } },
+    ]);
+  });
+
+  it("should keep one residual transaction across tables", () => {
+    const checkpoint = fold(
+      transaction("1", { count: { id: "1", value: 1 } }, "first"),
+      transaction("1", { count: { id: "1", value: 1 } }, "second"),
+      {
+        id: "2",
+        storeId: 1,
+        patch: {
+          first: { record: { count: [] } },
+          second: { record: { count: "unknown" } },
+        },
+      } as Datastore.Transaction
+    );
+    const residual = checkpoint.transactions.filter((t) => t.id === "2");
+    expect(residual.length).to.equal(1);
+    expect(Object.keys(residual[0].patch)).to.deep.equal(["first", "second"]);
+  });
+
+  it("should have ids which only depend on the transactions folded", () => {
+    const transactions = [
+      transaction("1", { count: { id: "1", value: 1 } }),
+      transaction("2", { count: "unknown" }),
+    ];
+    const checkpoint = fold(...transactions);
+    expect(fold(...transactions).transactions).to.deep.equal(checkpoint.transactions);
+    const restored = Checkpoint.fromJSON(JSON.parse(JSON.stringify(checkpoint)));
+    expect(restored.end).to.equal(2);
+    expect(restored.transactions).to.deep.equal(checkpoint.transactions);
+    // Restored residual fields stay residual.
+    restored.fold(transaction("3", { count: { id: "3", value: 3 } }), 3);
+    expect(restored.transactions.map((t) => t.id)).to.deep.equal([
+      "checkpoint:schema:3",
+      "2",
+      "3",
+    ]);
+  });
+});
+
+describe("TransactionLog", () => {
+  let directory: string;
+
+  beforeEach(() => {
+    directory = fs.mkdtempSync(path.join(os.tmpdir(), "rtc-relay-"));
+  });
+
+  afterEach(() => {
+    fs.rmdirSync(directory, { recursive: true });
+  });
+
+  function add(log: TransactionLog, count: number): void {
+    for (let i = 0; i < count; i++) {
+      const id = String(log.version + 1);
+      log.add(transaction(id, { count: { id, value: log.version } }));
+    }
+  }
+
+  it("should number the transactions", () => {
+    const log = new TransactionLog(directory, 2);
+    expect(log.add(transaction("1", { count: { id: "1", value: 1 } }))).to.equal(1);
+    expect(log.add(transaction("2", { count: { id: "2", value: 2 } }))).to.equal(2);
+    expect(log.version).to.equal(2);
+  });
+
+  it("should recover the checkpoint and the tail", () => {
+    const log = new TransactionLog(directory, 3);
+    add(log, 4);
+    const recovered = new TransactionLog(directory, 3);
+    expect(recovered.version).to.equal(4);
+    expect(recovered.transactions).to.deep.equal(log.transactions);
+  });
+
+  it("should skip the transactions folded before a crash", () => {
+    const log = new TransactionLog(directory, 3);
+    add(log, 2);
+    const tail = fs.readFileSync(path.join(directory, "tail.jsonl"), "utf8");
+    add(log, 1);
+    // Crashed after the checkpoint was saved, before the tail was truncated.
+    fs.writeFileSync(path.join(directory, "tail.jsonl"), tail);
+    const recovered = new TransactionLog(directory, 3);
+    expect(recovered.version).to.equal(3);
+    expect(recovered.transactions).to.deep.equal(log.transactions);
+  });
+
+  it("should drop a transaction cut by a crash", () => {
+    const log = new TransactionLog(directory, 10);
+    add(log, 2);
+    fs.appendFileSync(path.join(directory, "tail.jsonl"), '[3, {"id": "3"');
+    add(new TransactionLog(directory, 10), 1);
+    const recovered = new TransactionLog(directory, 10);
+    expect(recovered.version).to.equal(3);
+    expect(recovered.transactions.map((t) => t.id)).to.deep.equal(["1", "2", "3"]);
+  });
+
+  it("should only send the transactions a client missed", () => {
+    const log = new TransactionLog(directory, 2);
+    add(log, 3);
+    expect(log.since(1)!.map((t) => t.id)).to.deep.equal(["2", "3"]);
+    expect(log.since(3)).to.deep.equal([]);
+    add(log, 1);
+    expect(log.since(2)!.map((t) => t.id)).to.deep.equal(["3", "4"]);
+    // Folded in the checkpoint before the last one.
+    expect(log.since(1)).to.equal(null);
+    // Ahead of the log, e.g. after its directory was removed.
+    expect(log.since(5)).to.equal(null);
+  });
+});
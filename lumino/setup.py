@@ -32,6 +32,7 @@ setup(
     install_requires=[
         "fastapi",
         "typing",
+        "uvicorn",
     ],
     extras_require={
         "sphinx": [],